@@ -1,5 +1,59 @@
 from django.contrib import admin
-from books.models import Book, Publisher, Author
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from books.models import Book, Publisher, Author, Job
+
+
+"""
+Estimated Counts
+"""
+
+
+def estimate_row_count(queryset):
+    # Reads the database's own row estimate instead of running COUNT(*)
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table]
+            )
+        elif connection.vendor == "mysql":
+            cursor.execute(
+                "SELECT table_rows FROM information_schema.tables "
+                "WHERE table_schema = DATABASE() AND table_name = %s",
+                [table],
+            )
+        else:
+            # SQLite keeps no row estimate (MAX(rowid) never shrinks after
+            # deletes), so it gets an exact count
+            return None
+        row = cursor.fetchone()
+
+    if row and row[0] and row[0] > 0:
+        return int(row[0])
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    # Tables below this size are cheap enough to count exactly
+    estimate_threshold = 10000
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, "query", None)
+        if query is not None and not query.where:
+            estimate = estimate_row_count(self.object_list)
+            if estimate is not None and estimate >= self.estimate_threshold:
+                return estimate
+        return super().count
+
+
+"""
+Admin Classes
+"""
 
 
 class BookInLine(admin.TabularInline):
@@ -11,6 +65,20 @@ class BookAdmin(admin.ModelAdmin):
     fieldsets = [
         (None, {"fields": ["title", "authors", "publisher", "publication_date"]}),
     ]
+    autocomplete_fields = ["authors", "publisher"]
+    search_fields = ["title__iprefix"]
+    list_display = ["title", "author_names", "publisher", "publication_date"]
+    list_select_related = ["publisher"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related("authors")
+
+    @admin.display(description="Authors")
+    def author_names(self, obj):
+        # Uses the prefetched authors so each row doesn't run its own query
+        return ", ".join(str(author) for author in obj.authors.all())
 
 
 class AuthorAdmin(admin.ModelAdmin):
@@ -18,17 +86,39 @@ class AuthorAdmin(admin.ModelAdmin):
         (None, {"fields": ["first_name", "last_name"]}),
         ("e-mail", {"fields": ["email"]}),
     ]
-    search_fields = ["first_name", "last_name"]
+    search_fields = ["last_name__iprefix", "first_name__iprefix"]
     list_display = ["first_name", "last_name"]
+    ordering = ["last_name", "first_name"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 class PublisherAdmin(admin.ModelAdmin):
     fieldsets = [(None, {"fields": ["name", "city", "country", "website"]})]
-    search_fields = ["name", "city", "country", "website"]
+    search_fields = ["name__iprefix"]
+    list_display = ["name", "city", "country", "website"]
+    ordering = ["name"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = [
+        "kind",
+        "status",
+        "progress",
+        "total",
+        "attempts",
+        "created_at",
+        "finished_at",
+    ]
+    list_filter = ["status", "kind"]
+    readonly_fields = ["started_at", "heartbeat_at", "finished_at", "attempts"]
 
 
 admin.site.register(Book, BookAdmin)
 admin.site.register(Author, AuthorAdmin)
 admin.site.register(Publisher, PublisherAdmin)
+admin.site.register(Job, JobAdmin)
 
 # Register your models here.
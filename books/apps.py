@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class BooksConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "books"
+
+    def ready(self):
+        from books import lookups, signals  # noqa: F401
+
+        if getattr(settings, "GRAPHQL_PREBUILD_SCHEMA", False):
+            from books.views import prebuild_schema
+
+            prebuild_schema()
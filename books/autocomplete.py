@@ -0,0 +1,247 @@
+import logging
+import re
+import sys
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, bisect_right
+
+from django.conf import settings
+from django.db import connections
+from books.models import Book, Author
+
+"""
+Prefix Index
+
+Keys are normalized strings kept in one sorted list, with a parallel list of
+(kind, id) references. Every text is stored once under its full form (marked
+with FULL) and once per later word, so "rings" finds "The Lord of the Rings".
+Full-form matches live in their own key range and are returned first.
+"""
+
+FULL = "\x00"
+WORD = "\x01"
+
+non_alphanumeric = re.compile(r"[\W_]+")
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return non_alphanumeric.sub(" ", text.casefold()).strip()
+
+
+def index_keys(text):
+    text = normalize(text)
+    if not text:
+        return []
+
+    keys = [FULL + text]
+    for match in re.finditer(r" (?=\S)", text):
+        keys.append(WORD + text[match.end() :])
+    return keys
+
+
+class PrefixIndex:
+    def __init__(self):
+        self.keys = []
+        self.refs = []
+        self.texts = {}
+        self.lock = threading.Lock()
+        self.built_at = None
+
+    def build(self, entries):
+        # entries is an iterable of (kind, id, text), sorted once at the end
+        pairs = []
+        texts = {}
+        for kind, pk, text in entries:
+            # One shared reference tuple per row, not one per key
+            ref = (kind, pk)
+            texts[ref] = text
+            pairs.extend((key, ref) for key in index_keys(text))
+        pairs.sort()
+
+        with self.lock:
+            self.keys = [key for key, _ in pairs]
+            self.refs = [ref for _, ref in pairs]
+            self.texts = texts
+            self.built_at = time.monotonic()
+
+    def add(self, kind, pk, text):
+        ref = (kind, pk)
+        with self.lock:
+            self._remove(ref)
+            self.texts[ref] = text
+            for key in index_keys(text):
+                position = bisect_right(self.keys, key)
+                self.keys.insert(position, key)
+                self.refs.insert(position, ref)
+
+    def remove(self, kind, pk):
+        with self.lock:
+            self._remove((kind, pk))
+
+    def _remove(self, ref):
+        text = self.texts.pop(ref, None)
+        if text is None:
+            return
+        for key in index_keys(text):
+            start = bisect_left(self.keys, key)
+            end = bisect_right(self.keys, key, lo=start)
+            for position in range(start, end):
+                if self.refs[position] == ref:
+                    del self.keys[position]
+                    del self.refs[position]
+                    break
+
+    def search(self, prefix, limit=10):
+        # Returns up to `limit` (kind, id, text) tuples, full-text prefix
+        # matches before word matches, each group in alphabetical key order
+        prefix = normalize(prefix)
+        if not prefix or limit <= 0:
+            return []
+
+        results = []
+        seen = set()
+        with self.lock:
+            for marker in (FULL, WORD):
+                position = bisect_left(self.keys, marker + prefix)
+                while position < len(self.keys) and len(results) < limit:
+                    key = self.keys[position]
+                    if not key.startswith(marker + prefix):
+                        break
+                    ref = self.refs[position]
+                    if ref not in seen:
+                        seen.add(ref)
+                        results.append((*ref, self.texts[ref]))
+                    position += 1
+        return results
+
+    def __len__(self):
+        return len(self.keys)
+
+    def memory_usage(self):
+        # Approximate bytes held by the index structures, reference tuples
+        # are shared between keys so they are counted once per row
+        size = sys.getsizeof(self.keys) + sys.getsizeof(self.refs)
+        size += sum(sys.getsizeof(key) for key in self.keys)
+        size += sys.getsizeof(self.texts)
+        for ref, text in self.texts.items():
+            size += sys.getsizeof(ref) + sys.getsizeof(ref[1]) + sys.getsizeof(text)
+        return size
+
+
+"""
+Process-Wide Index
+"""
+
+logger = logging.getLogger(__name__)
+
+# The current index, each rebuild swaps in a new one so searches never wait
+# on a rebuild once the first index exists
+index = None
+
+# Held while an index is being built, by at most one thread
+build_lock = threading.Lock()
+
+# Changes made while a rebuild scans the tables are also recorded here and
+# replayed into the new index before it's swapped in
+changes_lock = threading.Lock()
+pending_changes = None
+
+
+def scan_entries(chunk_size=2000):
+    # Streams both tables instead of loading whole querysets into memory
+    books = Book.objects.values_list("pk", "title").iterator(chunk_size=chunk_size)
+    for pk, title in books:
+        yield "book", pk, title
+
+    authors = Author.objects.values_list("pk", "first_name", "last_name")
+    for pk, first_name, last_name in authors.iterator(chunk_size=chunk_size):
+        yield "author", pk, f"{first_name} {last_name}"
+
+
+def is_stale():
+    # Each process only sees its own signals, so other processes' writes are
+    # picked up by a periodic rebuild
+    interval = getattr(settings, "AUTOCOMPLETE_REBUILD_INTERVAL", None)
+    return interval is not None and time.monotonic() - index.built_at > interval
+
+
+def rebuild():
+    global index, pending_changes
+    with changes_lock:
+        pending_changes = []
+
+    new_index = PrefixIndex()
+    try:
+        new_index.build(scan_entries())
+    except BaseException:
+        with changes_lock:
+            pending_changes = None
+        raise
+
+    with changes_lock:
+        for change in pending_changes:
+            change(new_index)
+        pending_changes = None
+        index = new_index
+
+
+def run_rebuild():
+    try:
+        rebuild()
+    except Exception:
+        logger.exception("Rebuilding the autocomplete index failed")
+    finally:
+        build_lock.release()
+        connections.close_all()
+
+
+def get_index():
+    if index is None:
+        # First use, every search waits for this build
+        with build_lock:
+            if index is None:
+                rebuild()
+    elif is_stale() and build_lock.acquire(blocking=False):
+        # Searches keep using the current index meanwhile
+        threading.Thread(target=run_rebuild, daemon=True).start()
+    return index
+
+
+def record_change(change):
+    # change(index) applies one row's update to the current index, and to
+    # the one being built if a rebuild is running. Nothing is recorded
+    # before the first build, which reads the rows anyway
+    with changes_lock:
+        if index is not None:
+            change(index)
+        if pending_changes is not None:
+            pending_changes.append(change)
+
+
+def index_text(instance):
+    if isinstance(instance, Book):
+        return instance.title
+    return f"{instance.first_name} {instance.last_name}"
+
+
+def index_instance(instance):
+    kind, pk, text = instance._meta.model_name, instance.pk, index_text(instance)
+    record_change(lambda index: index.add(kind, pk, text))
+
+
+def unindex(kind, pk):
+    record_change(lambda index: index.remove(kind, pk))
+
+
+def reindex(model, pk):
+    # For writes that bypass signals, e.g. QuerySet.update
+    if model not in (Book, Author) or (index is None and pending_changes is None):
+        return
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        unindex(model._meta.model_name, pk)
+    else:
+        index_instance(instance)
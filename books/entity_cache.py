@@ -0,0 +1,213 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router, transaction
+from books.models import Publisher, Author
+
+"""
+Entity Cache
+
+Primary-key lookups of Author and Publisher rows go through two layers:
+
+- an identity map kept on the request (the GraphQL context), so a row is
+  loaded at most once per request;
+- a bounded process-wide LRU of row values. Every entry remembers the row's
+  version as read before the row was loaded, and save/delete bump that
+  version in the Django cache. Only a shared cache backend carries those
+  bumps to other processes, so entries also expire after ENTITY_CACHE_TTL.
+
+Cached rows are stored as plain field values and rebuilt with from_db, so
+callers always get their own instance and can modify it freely.
+"""
+
+CACHED_MODELS = (Author, Publisher)
+
+stats = Counter()
+lru = OrderedDict()
+lock = threading.Lock()
+
+
+def cache_size():
+    return getattr(settings, "ENTITY_CACHE_SIZE", 10000) or 0
+
+
+def cache_ttl():
+    return getattr(settings, "ENTITY_CACHE_TTL", 60)
+
+
+def entity_key(model, pk):
+    return (model._meta.label_lower, int(pk))
+
+
+def version_key(key):
+    return "entity-version:%s:%s" % key
+
+
+def request_cache(context):
+    # The identity map lives on the request, contexts without one (e.g.
+    # subscriptions or the shell) only use the process layer
+    if context is None:
+        return None
+    identity_map = getattr(context, "entity_cache", None)
+    if identity_map is None:
+        identity_map = {}
+        try:
+            context.entity_cache = identity_map
+        except AttributeError:
+            return None
+    return identity_map
+
+
+def field_names(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+"""
+Process Layer
+"""
+
+
+def current_versions(keys):
+    # One cache round trip for all the keys of a lookup
+    found = cache.get_many([version_key(key) for key in keys])
+    return {key: found.get(version_key(key), 0) for key in keys}
+
+
+def lru_get(model, key, version):
+    with lock:
+        entry = lru.get(key)
+        if entry is not None:
+            lru.move_to_end(key)
+    if entry is None:
+        return None
+
+    entry_version, expires_at, values = entry
+    if entry_version != version or (
+        expires_at is not None and time.monotonic() > expires_at
+    ):
+        with lock:
+            lru.pop(key, None)
+        return None
+    return model.from_db(router.db_for_read(model), field_names(model), values)
+
+
+def lru_set(instance, version):
+    # version must have been read before the row was loaded: a row read just
+    # before a concurrent write then carries the old version and is dropped
+    # by the next lookup, instead of being cached as current
+    size = cache_size()
+    if size <= 0:
+        return
+    key = entity_key(type(instance), instance.pk)
+    ttl = cache_ttl()
+    expires_at = time.monotonic() + ttl if ttl is not None else None
+    values = tuple(getattr(instance, name) for name in field_names(type(instance)))
+    with lock:
+        lru[key] = (version, expires_at, values)
+        lru.move_to_end(key)
+        while len(lru) > size:
+            lru.popitem(last=False)
+
+
+def invalidate(model, pk, context=None):
+    if model not in CACHED_MODELS:
+        return
+    key = entity_key(model, pk)
+    stats["invalidations"] += 1
+    try:
+        cache.incr(version_key(key))
+    except ValueError:
+        cache.set(version_key(key), 1, timeout=None)
+    with lock:
+        lru.pop(key, None)
+
+    identity_map = request_cache(context)
+    if identity_map is not None:
+        identity_map.pop(key, None)
+
+
+def invalidate_on_commit(model, pk):
+    # Invalidated right away and again after commit, so a concurrent reader
+    # can't re-cache the old row while the transaction is still open
+    invalidate(model, pk)
+    transaction.on_commit(lambda: invalidate(model, pk))
+
+
+"""
+Lookups
+"""
+
+
+def get_entity(model, pk, context=None):
+    # Same contract as model.objects.get(pk=pk), including DoesNotExist
+    entities = get_entities(model, [pk], context)
+    try:
+        return entities[int(pk)]
+    except (KeyError, TypeError, ValueError):
+        raise model.DoesNotExist(
+            f"{model._meta.object_name} matching query does not exist."
+        )
+
+
+def get_entities(model, pks, context=None):
+    # Returns {pk: instance} for the rows that exist, loading everything the
+    # two layers miss with a single query
+    identity_map = request_cache(context)
+    found = {}
+    keys = []
+
+    for pk in pks:
+        try:
+            key = entity_key(model, pk)
+        except (TypeError, ValueError):
+            continue
+
+        if identity_map is not None and key in identity_map:
+            stats["request_hits"] += 1
+            found[key[1]] = identity_map[key]
+        else:
+            keys.append(key)
+
+    if not keys:
+        return found
+
+    use_lru = cache_size() > 0
+    versions = current_versions(keys) if use_lru else {}
+    missing = []
+    for key in keys:
+        instance = lru_get(model, key, versions[key]) if use_lru else None
+        if instance is None:
+            missing.append(key[1])
+            continue
+        stats["process_hits"] += 1
+        found[key[1]] = instance
+        if identity_map is not None:
+            identity_map[key] = instance
+
+    if missing:
+        stats["misses"] += len(missing)
+        stats["queries"] += 1
+        for instance in model.objects.filter(pk__in=missing):
+            key = entity_key(model, instance.pk)
+            found[instance.pk] = instance
+            if use_lru:
+                lru_set(instance, versions[key])
+            if identity_map is not None:
+                identity_map[key] = instance
+
+    return found
+
+
+def hit_rate():
+    hits = stats["request_hits"] + stats["process_hits"]
+    lookups = hits + stats["misses"]
+    return hits / lookups if lookups else 0.0
+
+
+def clear():
+    with lock:
+        lru.clear()
+    stats.clear()
@@ -0,0 +1,205 @@
+import asyncio
+import json
+import socket
+import threading
+import time
+from queue import Empty, Full, Queue
+
+from django.conf import settings
+from django.db import transaction
+
+# Updates to the same row within this many seconds reach subscribers once
+COALESCE_WINDOW = 0.1
+
+# Seconds allowed for connecting to and writing to the broker
+BROKER_TIMEOUT = 2.0
+
+# Seconds between attempts to reach the broker while it is down
+RECONNECT_INTERVAL = 1.0
+
+# Events waiting to be sent to the broker, beyond this they're only delivered
+# to this process' subscribers
+OUTBOX_SIZE = 10000
+
+"""
+Coalescing
+"""
+
+
+def merge_event(pending, event):
+    # Keeps one event per row: a row created and then updated is still
+    # "created", any later delete wins
+    previous = pending.pop(event["id"], None)
+    if (
+        previous is not None
+        and previous["mutation"] == "created"
+        and event["mutation"] == "updated"
+    ):
+        event = previous
+    pending[event["id"]] = event
+
+
+"""
+Event Bus
+"""
+
+
+class EventBus:
+    def __init__(self):
+        self.subscribers = {}
+        self.lock = threading.Lock()
+
+    def publish(self, topic, event):
+        self.deliver(topic, event)
+
+    def deliver(self, topic, event):
+        # Can be called from any thread, events are handed to each
+        # subscriber's own event loop
+        with self.lock:
+            subscribers = list(self.subscribers.get(topic, ()))
+        for loop, queue in subscribers:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    async def listen(self, topic, window=COALESCE_WINDOW):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        subscriber = (loop, queue)
+        with self.lock:
+            self.subscribers.setdefault(topic, set()).add(subscriber)
+
+        try:
+            while True:
+                pending = {}
+                merge_event(pending, await queue.get())
+
+                deadline = loop.time() + window
+                while (timeout := deadline - loop.time()) > 0:
+                    try:
+                        event = await asyncio.wait_for(queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                    merge_event(pending, event)
+
+                for event in pending.values():
+                    yield event
+        finally:
+            with self.lock:
+                self.subscribers[topic].discard(subscriber)
+
+
+class BrokerEventBus(EventBus):
+    # Shares events between processes through the run_event_broker command.
+    # Published events go to the broker, which sends them back to every
+    # connected process (including this one) for local delivery.
+    #
+    # The connection is owned by a background thread, so publishing (which
+    # runs in on_commit on the request thread) only queues the event and
+    # never waits on the network.
+
+    def __init__(self, address):
+        super().__init__()
+        self.address = address
+        self.outbox = Queue(maxsize=OUTBOX_SIZE)
+        self.started = False
+        self.start_lock = threading.Lock()
+
+    def start(self):
+        with self.start_lock:
+            if not self.started:
+                self.started = True
+                threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        # Dials the broker, and dials again whenever the connection drops,
+        # also in processes that only listen
+        host, port = self.address.rsplit(":", 1)
+        while True:
+            try:
+                connection = socket.create_connection(
+                    (host, int(port)), timeout=BROKER_TIMEOUT
+                )
+            except OSError:
+                # Broker is unavailable, at least this process' subscribers
+                # hear about its own events
+                self.deliver_pending()
+                time.sleep(RECONNECT_INTERVAL)
+                continue
+
+            closed = threading.Event()
+            threading.Thread(
+                target=self.read, args=(connection, closed), daemon=True
+            ).start()
+            self.send(connection, closed)
+            connection.close()
+
+    def send(self, connection, closed):
+        while not closed.is_set():
+            try:
+                topic, event = self.outbox.get(timeout=RECONNECT_INTERVAL)
+            except Empty:
+                continue
+            line = json.dumps({"topic": topic, "event": event}) + "\n"
+            try:
+                connection.sendall(line.encode())
+            except OSError:
+                self.deliver(topic, event)
+                return
+
+    def read(self, connection, closed):
+        # recv() shares the socket's timeout with sendall, so a quiet broker
+        # only means waiting again
+        buffer = b""
+        try:
+            while True:
+                try:
+                    chunk = connection.recv(65536)
+                except socket.timeout:
+                    continue
+                if not chunk:
+                    break
+                *lines, buffer = (buffer + chunk).split(b"\n")
+                for line in lines:
+                    message = json.loads(line)
+                    self.deliver(message["topic"], message["event"])
+        except OSError:
+            pass
+        finally:
+            closed.set()
+
+    def deliver_pending(self):
+        while True:
+            try:
+                topic, event = self.outbox.get_nowait()
+            except Empty:
+                return
+            self.deliver(topic, event)
+
+    def publish(self, topic, event):
+        self.start()
+        try:
+            self.outbox.put_nowait((topic, event))
+        except Full:
+            self.deliver(topic, event)
+
+    async def listen(self, topic, window=COALESCE_WINDOW):
+        self.start()
+        async for event in super().listen(topic, window):
+            yield event
+
+
+def create_event_bus():
+    address = getattr(settings, "EVENT_BROKER_ADDRESS", None)
+    if address:
+        return BrokerEventBus(address)
+    return EventBus()
+
+
+event_bus = create_event_bus()
+
+
+def publish_change(model, pk, mutation):
+    # Subscribers only hear about committed changes
+    topic = model._meta.model_name
+    event = {"id": str(pk), "mutation": mutation}
+    transaction.on_commit(lambda: event_bus.publish(topic, event))
@@ -0,0 +1,467 @@
+from dataclasses import dataclass
+
+from django.db.models import Manager, QuerySet
+from graphql import (
+    DirectiveLocation,
+    DocumentNode,
+    ExecutionContext,
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLArgument,
+    GraphQLBoolean,
+    GraphQLDirective,
+    GraphQLError,
+    GraphQLInt,
+    GraphQLNonNull,
+    GraphQLString,
+    InlineFragmentNode,
+    NameNode,
+    SelectionSetNode,
+    execute,
+    get_named_type,
+    get_nullable_type,
+    get_operation_ast,
+    is_list_type,
+    parse,
+    validate,
+)
+from graphql.execution.collect_fields import collect_fields
+from graphql.execution.values import get_directive_values
+from graphql.validation import ValidationRule, specified_rules
+
+"""
+Incremental Delivery (@defer / @stream)
+
+graphql-core 3.2 validates these directives but ignores them while executing,
+so incremental delivery is done by rewriting the operation:
+
+- the initial pass runs without deferred fragments, with every streamed list
+  cut to its initialCount, and keeps the objects the later payloads start
+  from;
+- each deferred fragment then runs on the objects it applies to, as they were
+  resolved by the initial pass;
+- each streamed field runs once more on its parent objects, continuing after
+  the last item already sent.
+
+Streamed querysets are delivered in primary key order, and the remaining items
+are fetched by primary key rather than by offset, so rows written in between
+can't shift them. The query above a deferred fragment or a streamed field is
+never run twice.
+"""
+
+DeferDirective = GraphQLDirective(
+    name="defer",
+    locations=[DirectiveLocation.FRAGMENT_SPREAD, DirectiveLocation.INLINE_FRAGMENT],
+    args={
+        "if": GraphQLArgument(GraphQLNonNull(GraphQLBoolean), default_value=True),
+        "label": GraphQLArgument(GraphQLString),
+    },
+    description="Delivers the fragment after the rest of the response",
+)
+
+StreamDirective = GraphQLDirective(
+    name="stream",
+    locations=[DirectiveLocation.FIELD],
+    args={
+        "if": GraphQLArgument(GraphQLNonNull(GraphQLBoolean), default_value=True),
+        "label": GraphQLArgument(GraphQLString),
+        "initialCount": GraphQLArgument(GraphQLNonNull(GraphQLInt), default_value=0),
+    },
+    description="Delivers the first initialCount items, then the rest later",
+)
+
+
+@dataclass
+class Deferred:
+    node: InlineFragmentNode
+    key_path: tuple
+    label: str
+
+
+@dataclass
+class Streamed:
+    node: FieldNode
+    key_path: tuple
+    label: str
+    initial_count: int
+
+
+class StreamOnListRule(ValidationRule):
+    # @stream is only meaningful on list fields
+    def enter_field(self, node, *_args):
+        field = self.context.get_field_def()
+        if field is None or is_list_type(get_nullable_type(field.type)):
+            return
+        if any(directive.name.value == "stream" for directive in node.directives):
+            self.report_error(
+                GraphQLError(
+                    f"@stream can only be used on list fields, '{node.name.value}'"
+                    f" is of type '{field.type}'.",
+                    node,
+                )
+            )
+
+
+def active_directive(directive, node, variables):
+    values = get_directive_values(directive, node, variables)
+    if values is None or not values.get("if", True):
+        return None
+    return values
+
+
+def copy_node(node, **changes):
+    return node.__class__(
+        **{**{key: getattr(node, key) for key in node.keys}, **changes}
+    )
+
+
+"""
+Document Rewriting
+"""
+
+
+def inline_fragments(selection_set, fragments):
+    # Named fragments become inline fragments, so every deferred fragment and
+    # streamed field has exactly one position in the operation
+    selections = []
+    for selection in selection_set.selections:
+        if isinstance(selection, FragmentSpreadNode):
+            fragment = fragments[selection.name.value]
+            selection = InlineFragmentNode(
+                type_condition=fragment.type_condition,
+                directives=selection.directives,
+                selection_set=fragment.selection_set,
+            )
+        if selection.selection_set is not None:
+            selection = copy_node(
+                selection,
+                selection_set=inline_fragments(selection.selection_set, fragments),
+            )
+        selections.append(selection)
+    return SelectionSetNode(selections=tuple(selections))
+
+
+def collect(selection_set, variables, deferred, streamed, key_path=()):
+    # Work nested inside a deferred fragment is delivered with that fragment,
+    # so collection doesn't descend into deferred fragments
+    for selection in selection_set.selections:
+        if isinstance(selection, InlineFragmentNode):
+            defer = active_directive(DeferDirective, selection, variables)
+            if defer is not None:
+                deferred.append(Deferred(selection, key_path, defer.get("label")))
+            else:
+                collect(
+                    selection.selection_set, variables, deferred, streamed, key_path
+                )
+            continue
+
+        keys = key_path + ((selection.alias or selection.name).value,)
+        stream = active_directive(StreamDirective, selection, variables)
+        if stream is not None:
+            streamed.append(
+                Streamed(selection, keys, stream.get("label"), stream["initialCount"])
+            )
+        if selection.selection_set is not None:
+            collect(selection.selection_set, variables, deferred, streamed, keys)
+
+
+def non_empty(selections):
+    if not selections:
+        return (FieldNode(name=NameNode(value="__typename")),)
+    return tuple(selections)
+
+
+def strip_deferred(selection_set, variables):
+    selections = []
+    for selection in selection_set.selections:
+        if isinstance(selection, InlineFragmentNode) and active_directive(
+            DeferDirective, selection, variables
+        ):
+            continue
+        if selection.selection_set is not None:
+            selection = copy_node(
+                selection,
+                selection_set=strip_deferred(selection.selection_set, variables),
+            )
+        selections.append(selection)
+    return SelectionSetNode(selections=non_empty(selections))
+
+
+"""
+Execution
+"""
+
+
+def in_pk_order(items):
+    if isinstance(items, Manager):
+        items = items.all()
+    if isinstance(items, QuerySet):
+        items = items.order_by("pk")
+    return items
+
+
+def first_items(count):
+    return lambda items: in_pk_order(items)[:count]
+
+
+def remaining_items(delivered):
+    # Continues after the last row already sent, by primary key when the
+    # list is a queryset and by position otherwise
+    def window(items):
+        items = in_pk_order(items)
+        if isinstance(items, QuerySet) and delivered:
+            return items.filter(pk__gt=delivered[-1].pk)
+        return items[len(delivered) :]
+
+    return window
+
+
+class IncrementalMiddleware:
+    # Applies the windows of streamed lists and captures the values resolved
+    # at the given response paths (both without list indices). Captured lists
+    # are evaluated here, so later payloads see exactly the objects sent.
+    def __init__(self, windows, captured_paths=()):
+        self.windows = windows
+        self.captured = {path: [] for path in captured_paths}
+
+    def resolve(self, next, root, info, **args):
+        result = next(root, info, **args)
+        if result is None:
+            return result
+
+        key = tuple(key for key in info.path.as_list() if not isinstance(key, int))
+        window = self.windows.get(key)
+        if window is not None:
+            result = window(result)
+
+        captured = self.captured.get(key)
+        if captured is not None:
+            if is_list_type(get_nullable_type(info.return_type)):
+                result = list(result.all() if isinstance(result, Manager) else result)
+            captured.append((info.path, info.return_type, result))
+        return result
+
+
+def expand(captures):
+    # Yields (path, type, object) for the captured objects, stepping into
+    # captured lists. The schema only returns object types, so the field's
+    # named type is the runtime type.
+    for path, return_type, value in captures:
+        object_type = get_named_type(return_type)
+        if not isinstance(value, list):
+            yield path, object_type, value
+            continue
+        for index, item in enumerate(value):
+            if item is not None:
+                yield path.add_key(index), object_type, item
+
+
+def format_errors(errors):
+    return [error.formatted for error in errors]
+
+
+class IncrementalOperation:
+    def __init__(self, schema, operation, selection_set, variables, deferred, streamed):
+        self.schema = schema
+        self.document = DocumentNode(
+            definitions=(copy_node(operation, selection_set=selection_set),)
+        )
+        self.selection_set = selection_set
+        self.variables = variables
+        self.deferred = deferred
+        self.streamed = streamed
+        # Every error of every payload, e.g. for the slow-operation log
+        self.errors = []
+
+    def captured_paths(self):
+        paths = {deferred.key_path for deferred in self.deferred}
+        for stream in self.streamed:
+            paths.update((stream.key_path, stream.key_path[:-1]))
+        paths.discard(())
+        return paths
+
+    def run_initial(self, middleware, context_value, root_value):
+        incremental = IncrementalMiddleware(
+            {
+                stream.key_path: first_items(stream.initial_count)
+                for stream in self.streamed
+            },
+            self.captured_paths(),
+        )
+        document = DocumentNode(
+            definitions=(
+                copy_node(
+                    self.document.definitions[0],
+                    selection_set=strip_deferred(self.selection_set, self.variables),
+                ),
+            )
+        )
+        result = execute(
+            self.schema,
+            document,
+            root_value=root_value,
+            context_value=context_value,
+            variable_values=self.variables,
+            middleware=[*middleware, incremental],
+        )
+        captured = incremental.captured
+        captured[()] = [(None, self.schema.query_type, root_value)]
+        return result, captured
+
+    def run_on(
+        self,
+        parent_type,
+        parent,
+        path,
+        selection,
+        windows,
+        middleware,
+        context_value,
+        root_value,
+    ):
+        # Executes a single selection on an object resolved by the initial
+        # pass, as if it was part of the original response at path
+        context = ExecutionContext.build(
+            self.schema,
+            self.document,
+            root_value=root_value,
+            context_value=context_value,
+            raw_variable_values=self.variables,
+            middleware=[*middleware, IncrementalMiddleware(windows)],
+        )
+        if isinstance(context, list):
+            return None, context
+
+        fields = collect_fields(
+            self.schema,
+            context.fragments,
+            context.variable_values,
+            parent_type,
+            SelectionSetNode(selections=(selection,)),
+        )
+        try:
+            data = context.execute_fields(parent_type, parent, path, fields)
+        except GraphQLError as error:
+            context.collected_errors.add(error, None)
+            data = None
+        return data, context.collected_errors.errors
+
+    def subsequent(self, incremental, errors, pending):
+        self.errors.extend(errors)
+        if errors:
+            incremental.append({"errors": format_errors(errors), "path": []})
+        payload = {"hasNext": pending > 0}
+        if incremental:
+            payload["incremental"] = incremental
+        return payload
+
+    def execute(self, middleware=(), context_value=None, root_value=None):
+        # Yields the initial payload and then one payload per deferred
+        # fragment or streamed field
+        middleware = list(middleware)
+        pending = len(self.deferred) + len(self.streamed)
+
+        result, captured = self.run_initial(middleware, context_value, root_value)
+        payload = {"data": result.data, "hasNext": pending > 0}
+        if result.errors:
+            self.errors.extend(result.errors)
+            payload["errors"] = format_errors(result.errors)
+        yield payload
+
+        for deferred in self.deferred:
+            pending -= 1
+            incremental, errors = [], []
+            for path, parent_type, parent in expand(
+                captured.get(deferred.key_path, ())
+            ):
+                data, run_errors = self.run_on(
+                    parent_type,
+                    parent,
+                    path,
+                    deferred.node,
+                    {},
+                    middleware,
+                    context_value,
+                    root_value,
+                )
+                errors.extend(run_errors)
+                if data is None:
+                    continue
+                entry = {"data": data, "path": path.as_list() if path else []}
+                if deferred.label:
+                    entry["label"] = deferred.label
+                incremental.append(entry)
+            yield self.subsequent(incremental, errors, pending)
+
+        for stream in self.streamed:
+            pending -= 1
+            *parent_keys, key = stream.key_path
+            delivered = {
+                tuple(path.as_list()): items
+                for path, _, items in captured.get(stream.key_path, ())
+            }
+            incremental, errors = [], []
+            for path, parent_type, parent in expand(
+                captured.get(tuple(parent_keys), ())
+            ):
+                parent_path = path.as_list() if path else []
+                sent = delivered.get((*parent_path, key), [])
+                data, run_errors = self.run_on(
+                    parent_type,
+                    parent,
+                    path,
+                    stream.node,
+                    {stream.key_path: remaining_items(sent)},
+                    middleware,
+                    context_value,
+                    root_value,
+                )
+                errors.extend(run_errors)
+                items = (data or {}).get(key)
+                if not items:
+                    continue
+                entry = {"items": items, "path": [*parent_path, key, len(sent)]}
+                if stream.label:
+                    entry["label"] = stream.label
+                incremental.append(entry)
+            yield self.subsequent(incremental, errors, pending)
+
+
+incremental_rules = (*specified_rules, StreamOnListRule)
+
+
+def plan_incremental(
+    schema, query, variables=None, operation_name=None, validation_rules=None
+):
+    # Returns an IncrementalOperation when the query uses @defer or @stream,
+    # None when it should go through normal execution (including invalid
+    # queries, which get their errors there)
+    if not query or ("@defer" not in query and "@stream" not in query):
+        return None
+    try:
+        document = parse(query)
+    except GraphQLError:
+        return None
+    if validate(schema, document, validation_rules or incremental_rules):
+        return None
+
+    operation = get_operation_ast(document, operation_name)
+    if operation is None or operation.operation.value != "query":
+        return None
+
+    fragments = {
+        definition.name.value: definition
+        for definition in document.definitions
+        if isinstance(definition, FragmentDefinitionNode)
+    }
+    selection_set = inline_fragments(operation.selection_set, fragments)
+
+    deferred, streamed = [], []
+    collect(selection_set, variables or {}, deferred, streamed)
+    if not deferred and not streamed:
+        return None
+
+    return IncrementalOperation(
+        schema, operation, selection_set, variables or {}, deferred, streamed
+    )
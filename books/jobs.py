@@ -0,0 +1,200 @@
+import logging
+import time
+from datetime import timedelta
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from books.models import Book, Author, Publisher, Job
+
+logger = logging.getLogger(__name__)
+
+GUTENDEX_URL = "http://gutendex.com/books/"
+
+# Seconds to wait for the import source before giving up
+REQUEST_TIMEOUT = 30
+
+"""
+Job Registry
+"""
+
+handlers = {}
+
+
+def job_handler(kind):
+    # Registers a function as the handler for jobs of the given kind
+    def register(func):
+        handlers[kind] = func
+        return func
+
+    return register
+
+
+class JobError(Exception):
+    # Raised by handlers with a message that is safe to show to clients, any
+    # other exception is only reported as an internal error
+    pass
+
+
+def enqueue(kind, **payload):
+    if kind not in handlers:
+        raise ValueError(f"Unknown job kind: {kind}")
+    return Job.objects.create(kind=kind, payload=payload)
+
+
+"""
+Job Handlers
+"""
+
+
+def import_book(result):
+    book, _ = Book.objects.get_or_create(title=result.get("title"))
+
+    authors = []
+    for author_name in result["authors"]:
+        last_name, first_name = author_name.get("name").split(",")
+        author, _ = Author.objects.get_or_create(
+            last_name=last_name, first_name=first_name
+        )
+        authors.append(author)
+    book.authors.add(*authors)
+
+    return book, authors
+
+
+@job_handler("import_books")
+def import_books(job):
+    # The source is fixed, clients can't point workers at arbitrary hosts
+    import requests  # Only needed by workers, keeps it off the web startup path
+
+    try:
+        response = requests.get(GUTENDEX_URL, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        results = response.json()["results"]
+    except (requests.RequestException, ValueError, KeyError) as error:
+        raise JobError("The import source could not be read") from error
+
+    job.report(0, len(results))
+    for index, result in enumerate(results, start=1):
+        with transaction.atomic():
+            import_book(result)
+        job.report(index)
+
+
+@job_handler("delete_publisher")
+def delete_publisher(job, publisher_id, batch_size=500):
+    # Deletes the publisher's books in batches so each transaction stays short
+    # and progress can be reported, then the publisher itself
+    books = Book.objects.filter(publisher_id=publisher_id)
+    job.report(0, books.count())
+
+    deleted = 0
+    while True:
+        batch = list(books.values_list("pk", flat=True)[:batch_size])
+        if not batch:
+            break
+        with transaction.atomic():
+            Book.objects.filter(pk__in=batch).delete()
+        deleted += len(batch)
+        job.report(deleted)
+
+    Publisher.objects.filter(pk=publisher_id).delete()
+
+
+"""
+Workers
+"""
+
+
+def requeue_stale_jobs():
+    # A running job whose heartbeat (set by Job.report) is older than the
+    # lease lost its worker, e.g. the process died. It is queued again, or
+    # failed once it has used up its attempts.
+    lease = timedelta(seconds=getattr(settings, "JOB_LEASE_TIMEOUT", 300))
+    stale = Job.objects.filter(
+        status=Job.Status.RUNNING, heartbeat_at__lt=timezone.now() - lease
+    )
+    max_attempts = getattr(settings, "JOB_MAX_ATTEMPTS", 3)
+    stale.filter(attempts__gte=max_attempts).update(
+        status=Job.Status.FAILED,
+        error="The worker running this job stopped responding",
+        finished_at=timezone.now(),
+    )
+    stale.filter(attempts__lt=max_attempts).update(status=Job.Status.QUEUED)
+
+
+def claim_next_job():
+    # Claims the oldest queued job with a conditional UPDATE, so concurrent
+    # workers never run the same job twice
+    requeue_stale_jobs()
+    while True:
+        job_id = (
+            Job.objects.filter(status=Job.Status.QUEUED)
+            .order_by("created_at", "pk")
+            .values_list("pk", flat=True)
+            .first()
+        )
+        if job_id is None:
+            return None
+
+        now = timezone.now()
+        claimed = Job.objects.filter(pk=job_id, status=Job.Status.QUEUED).update(
+            status=Job.Status.RUNNING,
+            started_at=now,
+            heartbeat_at=now,
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=job_id)
+
+
+def run_job(job):
+    try:
+        handlers[job.kind](job, **job.payload)
+    except Job.LeaseLost:
+        # The job's new run owns it now, this one leaves it alone
+        logger.warning("Job %s (%s) lost its lease, stopping", job.pk, job.kind)
+        return job
+    except JobError as error:
+        job.status = Job.Status.FAILED
+        job.error = str(error)
+    except Exception:
+        # The traceback goes to the log only, it can name internal hosts
+        logger.exception("Job %s (%s) failed", job.pk, job.kind)
+        job.status = Job.Status.FAILED
+        job.error = "Internal error"
+    else:
+        job.status = Job.Status.SUCCEEDED
+
+    job.finished_at = timezone.now()
+    finished = job.owned().update(
+        status=job.status, error=job.error, finished_at=job.finished_at
+    )
+    if not finished:
+        logger.warning("Job %s (%s) lost its lease, result dropped", job.pk, job.kind)
+    return job
+
+
+def work(poll_interval=1.0, burst=False):
+    # Runs jobs until interrupted, or until the queue is empty when bursting
+    while True:
+        job = claim_next_job()
+        if job is None:
+            if burst:
+                return
+            time.sleep(poll_interval)
+            continue
+        run_job(job)
+
+
+def work_in_process(poll_interval=1.0, burst=False):
+    # Entry point for pool processes, spawned processes start without Django
+    if not apps.ready:
+        django.setup()
+    try:
+        work(poll_interval, burst)
+    finally:
+        connections.close_all()
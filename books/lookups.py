@@ -0,0 +1,29 @@
+from django.db.models import CharField, Lookup
+from django.db.models.functions import Lower
+from django.db.models.lookups import IStartsWith
+
+"""
+Custom Lookups
+"""
+
+
+@CharField.register_lookup
+class CaseInsensitivePrefix(Lookup):
+    # Case-insensitive prefix match. On SQLite it is written as a range over
+    # LOWER(column), which the LOWER() expression indexes can serve (LIKE
+    # can't). That range only equals a prefix match under binary collation,
+    # so other backends, whose default collations are linguistic, fall back
+    # to istartswith and don't use the index.
+    lookup_name = "iprefix"
+
+    def as_sql(self, compiler, connection):
+        return IStartsWith(self.lhs, self.rhs).as_sql(compiler, connection)
+
+    def as_sqlite(self, compiler, connection):
+        lhs, lhs_params = compiler.compile(Lower(self.lhs))
+        # Every value starting with the prefix sorts between the prefix and
+        # the prefix followed by the highest code point
+        return (
+            f"{lhs} >= LOWER(%s) AND {lhs} < LOWER(%s)",
+            [*lhs_params, self.rhs, *lhs_params, self.rhs + "\U0010ffff"],
+        )
@@ -0,0 +1,41 @@
+import time
+import timeit
+
+from django.core.management.base import BaseCommand
+from books.autocomplete import PrefixIndex, scan_entries
+
+
+class Command(BaseCommand):
+    help = "Builds the autocomplete index and reports its size and lookup speed"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "prefixes",
+            nargs="*",
+            default=["a", "the", "jo"],
+            help="Prefixes to time lookups for",
+        )
+        parser.add_argument("--limit", type=int, default=10)
+
+    def handle(self, *args, **options):
+        index = PrefixIndex()
+
+        start = time.perf_counter()
+        index.build(scan_entries())
+        build_time = time.perf_counter() - start
+
+        self.stdout.write(f"Indexed rows: {len(index.texts)}")
+        self.stdout.write(f"Index keys: {len(index)}")
+        self.stdout.write(f"Memory: {index.memory_usage() / 1024:.1f} KiB")
+        self.stdout.write(f"Build time: {build_time * 1000:.1f} ms")
+
+        for prefix in options["prefixes"]:
+            number = 1000
+            seconds = timeit.timeit(
+                lambda: index.search(prefix, options["limit"]), number=number
+            )
+            results = index.search(prefix, options["limit"])
+            self.stdout.write(
+                f"{prefix!r}: {len(results)} results in "
+                f"{seconds / number * 1_000_000:.1f} us"
+            )
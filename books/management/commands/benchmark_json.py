@@ -0,0 +1,68 @@
+import json
+import timeit
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from books.views import json_dumps, orjson
+
+
+class Command(BaseCommand):
+    help = "Benchmarks JSON encoding of representative GraphQL book list responses"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            nargs="+",
+            type=int,
+            default=[10, 100, 1000, 10000],
+            help="Number of books per response",
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=20, help="Encodings per measurement"
+        )
+
+    def build_response(self, size):
+        # Mirrors the shape of `{ books { id title publicationDate publisher
+        # { name website } authors { firstName lastName email } } }`
+        start = date(2000, 1, 1)
+        books = []
+        for i in range(size):
+            books.append(
+                {
+                    "id": str(i),
+                    "title": f"Book title number {i}",
+                    "publicationDate": (start + timedelta(days=i)).isoformat(),
+                    "publisher": {
+                        "name": f"Publisher {i % 50}",
+                        "website": f"https://publisher{i % 50}.example.com",
+                    },
+                    "authors": [
+                        {
+                            "firstName": f"First{j}",
+                            "lastName": f"Last{i}",
+                            "email": f"author{i}.{j}@example.com",
+                        }
+                        for j in range(2)
+                    ],
+                }
+            )
+        return {"data": {"books": books}}
+
+    def handle(self, *args, **options):
+        repeat = options["repeat"]
+        encoder = "orjson" if orjson is not None else "json (stdlib)"
+        self.stdout.write(f"Pluggable encoder backend: {encoder}")
+
+        for size in options["sizes"]:
+            response = self.build_response(size)
+
+            stdlib = timeit.timeit(
+                lambda: json.dumps(response, separators=(",", ":")), number=repeat
+            )
+            pluggable = timeit.timeit(lambda: json_dumps(response), number=repeat)
+
+            self.stdout.write(
+                f"{size:>6} books: stdlib {stdlib / repeat * 1000:8.3f} ms, "
+                f"pluggable {pluggable / repeat * 1000:8.3f} ms "
+                f"({stdlib / pluggable:.1f}x)"
+            )
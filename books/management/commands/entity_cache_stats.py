@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from books import entity_cache
+from books.views import get_schema
+
+# Representative read workload: books reached through their authors resolve
+# their publisher by id (top-level book lists join it instead)
+WORKLOAD = [
+    "{ authors { lastName bookSet { id title publisher { id name } } } }",
+    "{ authors { bookSet { id publisher { name website } } } }",
+]
+
+
+class Command(BaseCommand):
+    help = "Replays a read workload with and without the entity cache and reports the queries saved"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requests", type=int, default=20, help="Requests per workload query"
+        )
+
+    def run_workload(self, requests):
+        schema = get_schema()
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(requests):
+                for query in WORKLOAD:
+                    # A fresh context per request, like a new HttpRequest
+                    result = schema.execute(query, context_value=SimpleNamespace())
+                    if result.errors:
+                        raise result.errors[0]
+        return len(queries)
+
+    def handle(self, *args, **options):
+        requests = options["requests"]
+
+        entity_cache.clear()
+        with override_settings(ENTITY_CACHE_SIZE=0):
+            request_only = self.run_workload(requests)
+        request_only_stats = dict(entity_cache.stats)
+
+        entity_cache.clear()
+        both_layers = self.run_workload(requests)
+        stats = entity_cache.stats
+
+        lookups = stats["request_hits"] + stats["process_hits"] + stats["misses"]
+        self.stdout.write(f"Requests: {requests * len(WORKLOAD)}")
+        self.stdout.write(
+            f"Lookups by id (one query each without the cache): {lookups}"
+        )
+        self.stdout.write(
+            f"Request identity map only: {request_only} queries, "
+            f"{request_only_stats.get('request_hits', 0)} request hits"
+        )
+        self.stdout.write(
+            f"Request + process cache:   {both_layers} queries, "
+            f"{stats['request_hits']} request hits, "
+            f"{stats['process_hits']} process hits, {stats['misses']} misses"
+        )
+        self.stdout.write(f"Hit rate: {entity_cache.hit_rate():.1%}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Queries saved by the process cache: {request_only - both_layers}"
+            )
+        )
@@ -1,32 +1,38 @@
 import requests
 from django.core.management.base import BaseCommand
-from books.models import Book, Author
+from books.jobs import GUTENDEX_URL, REQUEST_TIMEOUT, enqueue, import_book
 
 
 class Command(BaseCommand):
     help = "Imports books and authors from the Gutendex API endpoint"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--async",
+            action="store_true",
+            dest="enqueue",
+            help="Queue the import for the background workers and return",
+        )
+
     def handle(self, *args, **options):
-        url = "http://gutendex.com/books/"
+        url = GUTENDEX_URL
+
+        if options["enqueue"]:
+            job = enqueue("import_books")
+            self.stdout.write(f"Queued import job {job.pk}")
+            return
 
-        response = requests.get(url)
+        response = requests.get(url, timeout=REQUEST_TIMEOUT)
         if response.status_code == 200:
             data = response.json()
 
             for result in data["results"]:
-                title = (result.get("title"),)
-                book, _ = Book.objects.get_or_create(title=title)
-                self.stdout.write(f"Adding book {title} to the database ...")
-
-                for author_name in result["authors"]:
-                    last_name, first_name = author_name.get("name").split(",")
-                    author, _ = Author.objects.get_or_create(
-                        last_name=last_name, first_name=first_name
-                    )
-                    book.authors.add(author)
+                book, authors = import_book(result)
+                self.stdout.write(f"Adding book {book.title} to the database ...")
 
+                for author in authors:
                     self.stdout.write(
-                        f"Adding author {last_name}, {first_name} to the database ..."
+                        f"Adding author {author.last_name}, {author.first_name} to the database ..."
                     )
 
         else:
@@ -0,0 +1,41 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Runs a local broker that shares change events between worker processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+
+    def handle(self, *args, **options):
+        asyncio.run(self.serve(options["host"], options["port"]))
+
+    async def serve(self, host, port):
+        clients = set()
+
+        async def send(client, line):
+            # Waits for the client's buffer to drain, a client that went away
+            # is dropped
+            try:
+                client.write(line)
+                await client.drain()
+            except ConnectionError:
+                clients.discard(client)
+
+        async def handle_client(reader, writer):
+            # Every line a process publishes is fanned out to all processes
+            clients.add(writer)
+            try:
+                while line := await reader.readline():
+                    await asyncio.gather(*(send(client, line) for client in clients))
+            finally:
+                clients.discard(writer)
+                writer.close()
+
+        server = await asyncio.start_server(handle_client, host, port)
+        self.stdout.write(f"Event broker listening on {host}:{port}")
+        async with server:
+            await server.serve_forever()
@@ -0,0 +1,49 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from books.jobs import work, work_in_process
+
+
+class Command(BaseCommand):
+    help = "Runs background job workers in a pool of processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes", type=int, default=1, help="Number of worker processes"
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait between polls when the queue is empty",
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Exit once the queue is empty instead of polling",
+        )
+
+    def handle(self, *args, **options):
+        processes = options["processes"]
+        poll_interval = options["poll_interval"]
+        burst = options["burst"]
+        if processes < 1:
+            raise CommandError("--processes must be at least 1")
+
+        self.stdout.write(f"Starting {processes} worker process(es) ...")
+
+        if processes == 1:
+            work(poll_interval, burst)
+        else:
+            # Connections must not be shared with forked worker processes
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                futures = [
+                    pool.submit(work_in_process, poll_interval, burst)
+                    for _ in range(processes)
+                ]
+                for future in futures:
+                    future.result()
+
+        self.stdout.write(self.style.SUCCESS("Workers stopped"))
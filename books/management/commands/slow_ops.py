@@ -0,0 +1,80 @@
+import json
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Plan lines that point at a full table scan or a temporary sort
+SCAN_MARKERS = ("SCAN ", "Seq Scan", "USE TEMP B-TREE", "type: ALL")
+
+
+class Command(BaseCommand):
+    help = "Summarizes the slow-operation log by fingerprint, worst first"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=10)
+        parser.add_argument(
+            "--log", default=None, help="Log file (defaults to SLOW_OPERATION_LOG)"
+        )
+
+    def read_records(self, path):
+        # Rotated files (.1, .2, ...) are read as well
+        files = [path, *sorted(path.parent.glob(path.name + ".*"))]
+        for file in files:
+            if not file.exists():
+                continue
+            with file.open(encoding="utf-8") as lines:
+                for line in lines:
+                    if line.strip():
+                        yield json.loads(line)
+
+    def handle(self, *args, **options):
+        path = Path(options["log"] or settings.SLOW_OPERATION_LOG)
+
+        groups = defaultdict(list)
+        for record in self.read_records(path):
+            groups[record["fingerprint"]].append(record)
+
+        if not groups:
+            self.stdout.write(f"No slow operations logged in {path}")
+            return
+
+        ranked = sorted(
+            groups.values(),
+            key=lambda records: sum(record["duration_ms"] for record in records),
+            reverse=True,
+        )
+
+        for records in ranked[: options["top"]]:
+            worst = max(records, key=lambda record: record["duration_ms"])
+            durations = [record["duration_ms"] for record in records]
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{worst['fingerprint']} {worst['operation_name'] or '(anonymous)'}: "
+                    f"{len(records)} calls, avg {sum(durations) / len(records):.1f} ms, "
+                    f"max {max(durations):.1f} ms"
+                )
+            )
+            self.stdout.write("  " + " ".join(worst["query"].split())[:200])
+
+            for path_name, timing in list(worst["resolvers"].items())[:3]:
+                self.stdout.write(
+                    f"  resolver {path_name}: {timing['calls']} calls, "
+                    f"{timing['total_ms']:.1f} ms"
+                )
+
+            statements = defaultdict(lambda: [0, 0.0, None])
+            for statement in worst["sql"]:
+                entry = statements[statement["sql"]]
+                entry[0] += 1
+                entry[1] += statement["duration_ms"]
+                entry[2] = statement["plan"]
+
+            self.stdout.write(f"  {len(worst['sql'])} SQL statements")
+            slowest = sorted(statements.items(), key=lambda item: item[1][1])
+            for sql, (count, total_ms, plan) in reversed(slowest[-3:]):
+                self.stdout.write(f"  {count}x {total_ms:.1f} ms  {sql[:150]}")
+                for line in plan or []:
+                    if any(marker in line for marker in SCAN_MARKERS):
+                        self.stdout.write(self.style.ERROR(f"      plan: {line}"))
@@ -0,0 +1,65 @@
+import json
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Runs in a fresh interpreter so every import is cold
+STARTUP_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+import bookstore.urls
+urls = time.perf_counter()
+from books.views import get_schema
+get_schema()
+schema = time.perf_counter()
+print(json.dumps({
+    "django.setup()": setup - start,
+    "import bookstore.urls": urls - setup,
+    "build schema (first request)": schema - urls,
+}))
+"""
+
+
+class Command(BaseCommand):
+    help = "Measures cold-start time of a worker and breaks it down by import"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--top", type=int, default=15, help="Number of packages to list"
+        )
+
+    def handle(self, *args, **options):
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", STARTUP_SCRIPT],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+        )
+        if process.returncode != 0:
+            self.stdout.write(self.style.ERROR(process.stderr))
+            return
+
+        phases = json.loads(process.stdout.strip().splitlines()[-1])
+        self.stdout.write("Cold start phases:")
+        for phase, seconds in phases.items():
+            self.stdout.write(f"  {phase:<30} {seconds * 1000:8.1f} ms")
+        self.stdout.write(f"  {'total':<30} {sum(phases.values()) * 1000:8.1f} ms")
+
+        # -X importtime lines look like "import time: self | cumulative | name"
+        self_times = defaultdict(int)
+        for line in process.stderr.splitlines():
+            if not line.startswith("import time:") or "[us]" in line:
+                continue
+            self_us, _, name = line[len("import time:") :].split("|")
+            self_times[name.strip().split(".")[0]] += int(self_us)
+
+        self.stdout.write("Import time by top-level package (self time):")
+        ranked = sorted(self_times.items(), key=lambda item: item[1], reverse=True)
+        for package, micros in ranked[: options["top"]]:
+            self.stdout.write(f"  {package:<30} {micros / 1000:8.1f} ms")
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-19 04:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("books", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="author",
+            index=models.Index(
+                fields=["last_name", "first_name"],
+                name="books_autho_last_na_7ca250_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(fields=["title"], name="books_book_title_d3218d_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="publisher",
+            index=models.Index(fields=["name"], name="books_publi_name_450a32_idx"),
+        ),
+    ]
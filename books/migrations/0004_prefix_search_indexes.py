@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-19 04:47
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("books", "0003_job"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="author",
+            index=models.Index(
+                django.db.models.functions.text.Lower("last_name"),
+                name="books_author_last_name_lower",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="author",
+            index=models.Index(
+                django.db.models.functions.text.Lower("first_name"),
+                name="books_author_first_name_lower",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(
+                django.db.models.functions.text.Lower("title"),
+                name="books_book_title_lower",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="publisher",
+            index=models.Index(
+                django.db.models.functions.text.Lower("name"),
+                name="books_publisher_name_lower",
+            ),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Lower
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from datetime import timedelta
@@ -20,6 +21,12 @@ class Publisher(models.Model):
     class Meta:
         verbose_name = _("Publisher")
         verbose_name_plural = _("Publishers")
+        indexes = [
+            models.Index(fields=["name"]),
+            # Serves the admin's case-insensitive prefix search (iprefix) on
+            # SQLite, see books/lookups.py
+            models.Index(Lower("name"), name="books_publisher_name_lower"),
+        ]
 
 
 class Book(models.Model):
@@ -45,6 +52,10 @@ class Book(models.Model):
     class Meta:
         verbose_name = _("Book")
         verbose_name_plural = _("Books")
+        indexes = [
+            models.Index(fields=["title"]),
+            models.Index(Lower("title"), name="books_book_title_lower"),
+        ]
 
 
 class Author(models.Model):
@@ -58,9 +69,67 @@ class Author(models.Model):
     class Meta:
         verbose_name = _("Author")
         verbose_name_plural = _("Authors")
+        indexes = [
+            models.Index(fields=["last_name", "first_name"]),
+            models.Index(Lower("last_name"), name="books_author_last_name_lower"),
+            models.Index(Lower("first_name"), name="books_author_first_name_lower"),
+        ]
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
 
+class Job(models.Model):
+    class Status(models.TextChoices):
+        QUEUED = "queued", _("Queued")
+        RUNNING = "running", _("Running")
+        SUCCEEDED = "succeeded", _("Succeeded")
+        FAILED = "failed", _("Failed")
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.QUEUED
+    )
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(null=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True)
+    heartbeat_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+    attempts = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = _("Job")
+        verbose_name_plural = _("Jobs")
+        indexes = [models.Index(fields=["status", "created_at"])]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+    class LeaseLost(Exception):
+        # The job was requeued or failed while this worker was running it
+        pass
+
+    def owned(self):
+        # This run of the job, a later claim bumps attempts
+        return Job.objects.filter(
+            pk=self.pk, status=Job.Status.RUNNING, attempts=self.attempts
+        )
+
+    def report(self, progress, total=None):
+        # Also the worker's heartbeat, jobs that stop reporting are requeued.
+        # Raises LeaseLost once the job has been handed to another run, so
+        # the handler stops.
+        self.progress = progress
+        self.heartbeat_at = timezone.now()
+        changes = {"progress": progress, "heartbeat_at": self.heartbeat_at}
+        if total is not None:
+            self.total = total
+            changes["total"] = total
+        if not self.owned().update(**changes):
+            raise Job.LeaseLost(f"Job {self.pk} is no longer owned by this run")
+
+
 # Create your models here.
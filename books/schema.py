@@ -1,8 +1,17 @@
 import graphene
 import re
-from graphql import GraphQLError
+from contextlib import aclosing
+from django.db import transaction
+from django.db.models import Q
+from graphql import GraphQLError, get_named_type, specified_directives
+from graphql.execution.collect_fields import collect_sub_fields
 from graphene_django import DjangoObjectType
-from books.models import Book, Publisher, Author
+from books.autocomplete import get_index, reindex
+from books.entity_cache import get_entities, get_entity, invalidate
+from books.events import event_bus, publish_change
+from books.incremental import DeferDirective, StreamDirective
+from books.jobs import enqueue
+from books.models import Book, Publisher, Author, Job
 
 """
 Custom Scalar Types 
@@ -114,6 +123,16 @@ class BookType(DjangoObjectType):
     class Meta:
         model = Book
 
+    def resolve_publisher(self, info):
+        if self.publisher_id is None:
+            return None
+        if Book.publisher.is_cached(self):
+            # Joined by the list query, see with_relations
+            return self.publisher
+        return get_entities(Publisher, [self.publisher_id], info.context).get(
+            self.publisher_id
+        )
+
 
 class PublisherType(DjangoObjectType):
     class Meta:
@@ -137,16 +156,50 @@ class AuthorType(DjangoObjectType):
         return queryset
 
 
+class JobType(DjangoObjectType):
+    # The payload stays internal, error only holds a client-safe message
+    class Meta:
+        model = Job
+        fields = [
+            "id",
+            "kind",
+            "status",
+            "progress",
+            "total",
+            "error",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+
+
+class AutocompleteKind(graphene.Enum):
+    BOOK = "book"
+    AUTHOR = "author"
+
+
+class AutocompleteResult(graphene.ObjectType):
+    kind = graphene.Field(AutocompleteKind)
+    id = graphene.ID()
+    text = graphene.String()
+
+
 class Query(graphene.ObjectType):
     books = graphene.List(BookType, search=graphene.String())
     publishers = graphene.List(PublisherType, search=graphene.String())
     authors = graphene.List(AuthorType, search=graphene.String())
+    job = graphene.Field(JobType, id=graphene.ID(required=True))
+    autocomplete = graphene.List(
+        AutocompleteResult,
+        prefix=graphene.String(required=True),
+        limit=graphene.Int(default_value=10),
+    )
 
     def resolve_books(self, info, search=None):
         if search:
-            return Book.objects.filter(title__icontains=search)
+            return with_relations(Book.objects.filter(title__icontains=search), info)
         else:
-            return Book.objects.all()
+            return with_relations(Book.objects.all(), info)
 
     def resolve_publishers(self, info, search=None):
         if search:
@@ -160,6 +213,132 @@ class Query(graphene.ObjectType):
             queryset = AuthorType.filter_author(queryset, search)
         return Author.objects.all()
 
+    def resolve_job(self, info, id):
+        return Job.objects.filter(pk=id).first()
+
+    def resolve_autocomplete(self, info, prefix, limit=10):
+        if limit is None:  # An explicit null gets the default as well
+            limit = 10
+        return [
+            AutocompleteResult(kind=kind, id=pk, text=text)
+            for kind, pk, text in get_index().search(prefix, min(limit, 50))
+        ]
+
+
+"""
+Partial Update Helpers
+"""
+
+
+def get_changes(model, patch, field_map):
+    # Maps the arguments present in the patch to model columns, omitted
+    # arguments are left untouched
+    changes = {}
+    for argument, field in field_map.items():
+        if argument not in patch:
+            continue
+        value = patch[argument]
+        if value is None and not model._meta.get_field(field).null:
+            raise GraphQLError(f"{argument} cannot be null")
+        changes[field] = value
+    return changes
+
+
+def is_selected(info, field_name):
+    # Whether the client asked for the given field on the returned object(s),
+    # fragments and @skip/@include are resolved the way execution does
+    fields = collect_sub_fields(
+        info.schema,
+        info.fragments,
+        info.variable_values,
+        get_named_type(info.return_type),
+        info.field_nodes,
+    )
+    return any(
+        node.name.value == field_name for nodes in fields.values() for node in nodes
+    )
+
+
+def with_relations(books, info):
+    # Loads the selected relations of a book list with one query each,
+    # instead of one lookup per book
+    if is_selected(info, "publisher"):
+        books = books.select_related("publisher")
+    if is_selected(info, "authors"):
+        books = books.prefetch_related("authors")
+    return books
+
+
+def to_pk(value, label):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise GraphQLError(f"Invalid {label} id: {value}")
+
+
+def patch_object(model, pk, changes, info, field_name):
+    # Writes only the changed columns of a single row. When the payload
+    # doesn't ask for the object it is never loaded, a single UPDATE is run
+    label = model._meta.verbose_name
+    if not is_selected(info, field_name):
+        # Rows already holding every value are excluded, exists() then tells
+        # an unchanged row from a missing one
+        queryset = model.objects.filter(pk=pk)
+        updated = queryset.exclude(Q(**changes)).update(**changes) if changes else 0
+        if not updated and not queryset.exists():
+            raise GraphQLError(f"{label} with id {pk} does not exist")
+        if updated:
+            # QuerySet.update doesn't send post_save, so publish it here
+            publish_change(model, pk, "updated")
+            transaction.on_commit(lambda: reindex(model, pk))
+            invalidate(model, pk, info.context)
+            transaction.on_commit(lambda: invalidate(model, pk))
+        return None
+
+    # Loaded from the database, not the entity cache: the comparison below
+    # decides what gets written and must not run against a stale copy
+    try:
+        instance = model.objects.get(pk=pk)
+    except model.DoesNotExist:
+        raise GraphQLError(f"{label} with id {pk} does not exist")
+
+    changed = [
+        field for field, value in changes.items() if getattr(instance, field) != value
+    ]
+    for field in changed:
+        setattr(instance, field, changes[field])
+    if changed:
+        instance.save(update_fields=changed)
+        invalidate(model, pk, info.context)
+    return instance
+
+
+"""
+Partial Update Input Types
+"""
+
+
+class UpdatePublisherInput(graphene.InputObjectType):
+    name = graphene.String()
+    address = graphene.String()
+    city = graphene.String()
+    stateProvince = graphene.String()
+    country = graphene.String()
+    website = Website()
+
+
+class UpdateAuthorInput(graphene.InputObjectType):
+    firstName = graphene.String()
+    lastName = graphene.String()
+    email = Email()
+
+
+class UpdateBookInput(graphene.InputObjectType):
+    title = graphene.String()
+    authorIDs = graphene.List(graphene.NonNull(graphene.ID))
+    publisherID = graphene.ID()
+    publicationDate = graphene.Date()
+
 
 """
 Publisher CRUD Methods
@@ -202,48 +381,26 @@ class CreatePublisherMutation(graphene.Mutation):
 
 
 class UpdatePublisherMutation(graphene.Mutation):
-    publisherID = graphene.ID(required=True)
-    name = graphene.String(required=True)
-    address = graphene.String(required=True)
-    city = graphene.String(required=True)
-    stateProvince = graphene.String(required=True)
-    country = graphene.String(required=True)
-    website = Website(required=True)
+    class Arguments:
+        publisherID = graphene.ID(required=True)
+        input = UpdatePublisherInput(required=True)
 
     publisher = graphene.Field(PublisherType)
 
-    def mutate(
-        self,
-        info,
-        publisherID,
-        name,
-        address,
-        city,
-        stateProvince,
-        country,
-        website,
-    ):
-        try:
-            publisher = Publisher.objects.get(
-                pk=publisherID
-            )  # Check if Publisher Exists
-        except Publisher.DoesNotExist:
-            raise GraphQLError(f"Book with id {publisherID} does not exist")
-
-        if name:
-            publisher.name = name
-        if address:
-            publisher.address = address
-        if city:
-            publisher.city = city
-        if stateProvince:
-            publisher.state_province = stateProvince
-        if country:
-            publisher.country = country
-        if website:
-            publisher.website = website
-
-        publisher.save()
+    field_map = {
+        "name": "name",
+        "address": "address",
+        "city": "city",
+        "stateProvince": "state_province",
+        "country": "country",
+        "website": "website",
+    }
+
+    def mutate(self, info, publisherID, input):
+        changes = get_changes(Publisher, input, UpdatePublisherMutation.field_map)
+        publisher = patch_object(
+            Publisher, to_pk(publisherID, "publisher"), changes, info, "publisher"
+        )
         return UpdatePublisherMutation(publisher=publisher)
 
 
@@ -299,27 +456,23 @@ class CreateAuthorMutation(graphene.Mutation):
 
 
 class UpdateAuthorMutation(graphene.Mutation):
-    authorID = graphene.ID(required=True)
-    firstName = graphene.String(required=True)
-    lastName = graphene.String(required=True)
-    email = Email(required=True)
+    class Arguments:
+        authorID = graphene.ID(required=True)
+        input = UpdateAuthorInput(required=True)
 
-    author = graphene.Field(PublisherType)
+    author = graphene.Field(AuthorType)
 
-    def mutate(self, info, authorID, firstName, lastName, email):
-        try:
-            author = Author.objects.get(pk=authorID)  # Check if Publisher Exists
-        except Author.DoesNotExist:
-            raise GraphQLError(f"Book with id {authorID} does not exist")
+    field_map = {
+        "firstName": "first_name",
+        "lastName": "last_name",
+        "email": "email",
+    }
 
-        if firstName:
-            author.first_name = firstName
-        if lastName:
-            author.last_name = lastName
-        if email:
-            author.email = email
-
-        author.save()
+    def mutate(self, info, authorID, input):
+        changes = get_changes(Author, input, UpdateAuthorMutation.field_map)
+        author = patch_object(
+            Author, to_pk(authorID, "author"), changes, info, "author"
+        )
         return UpdateAuthorMutation(author=author)
 
 
@@ -331,8 +484,8 @@ class DeleteAuthorMutation(graphene.Mutation):
 
     def mutate(self, info, authorID):
         try:
-            author = Author.objects.get(pk=authorID)  # Check if Publisher Exists
-        except Publisher.DoesNotExist:
+            author = Author.objects.get(pk=authorID)  # Check if Author Exists
+        except Author.DoesNotExist:
             raise GraphQLError(f"Author with id {authorID} does not exist")
 
         author.delete()
@@ -363,8 +516,8 @@ class CreateBookMutation(graphene.Mutation):
                 message="A book with the same title already exists in the database."
             )
 
-        author = Author.objects.get(pk=authorID)
-        publisher = Publisher.objects.get(pk=publisherID)
+        author = get_entity(Author, authorID, info.context)
+        publisher = get_entity(Publisher, publisherID, info.context)
         book = Book.objects.create(
             title=title,
             publication_date=publicationDate,
@@ -377,43 +530,53 @@ class CreateBookMutation(graphene.Mutation):
 
 
 class UpdateBookMutation(graphene.Mutation):
-    bookID = graphene.ID(required=True)
-    title = graphene.String(required=True)
-    authorID = graphene.Int(required=True)
-    publisherID = graphene.Int(required=True)
-    publicationDate = graphene.Date(required=True)
+    class Arguments:
+        bookID = graphene.ID(required=True)
+        input = UpdateBookInput(required=True)
 
-    book = graphene.Field(PublisherType)
+    book = graphene.Field(BookType)
 
-    def mutate(self, info, bookID, title, authorID, publisherID, publicationDate):
-        try:
-            book = Book.objects.get(pk=bookID)  # Check if Publisher Exists
-        except Book.DoesNotExist:
-            raise GraphQLError(f"Book with id {bookID} does not exist")
-
-        if title:
-            book.title = title
-        if authorID:
-            try:
-                author = Author.objects.get(pk=authorID)
-            except Book.DoesNotExist:
+    field_map = {
+        "title": "title",
+        "publisherID": "publisher_id",
+        "publicationDate": "publication_date",
+    }
+
+    def mutate(self, info, bookID, input):
+        bookID = to_pk(bookID, "book")
+        changes = get_changes(Book, input, UpdateBookMutation.field_map)
+
+        if changes.get("publisher_id") is not None:
+            publisherID = to_pk(changes["publisher_id"], "publisher")
+            if not get_entities(Publisher, [publisherID], info.context):
                 raise GraphQLError(
-                    f"Book with author that has id {authorID} does not exist"
+                    f"Book with publisher that has id {publisherID} does not exist"
                 )
-            book.authors = [author]
-        if publisherID:
-            try:
-                publisher = Publisher.objects.get(pk=publisherID)
-            except Publisher.DoesNotExist:
+            changes["publisher_id"] = publisherID
+
+        authorIDs = None
+        if input.get("authorIDs") is not None:
+            authorIDs = {to_pk(authorID, "author") for authorID in input["authorIDs"]}
+            found = set(get_entities(Author, authorIDs, info.context))
+            if authorIDs - found:
+                missing = ", ".join(str(pk) for pk in sorted(authorIDs - found))
                 raise GraphQLError(
-                    f"Book with publisher that has id {publisherID} does not exist"
+                    f"Book with author that has id {missing} does not exist"
                 )
-        if publicationDate:
-            book.publication_date = (
-                publicationDate  # Can be checked if date given is valid
-            )
 
-        book.save()
+        # The columns and the author diff are applied together or not at all
+        with transaction.atomic():
+            book = patch_object(Book, bookID, changes, info, "book")
+
+            if authorIDs is not None:
+                # Only the difference is written, unchanged author rows stay put
+                authors = (book or Book(pk=bookID)).authors
+                current = set(authors.values_list("pk", flat=True))
+                if current - authorIDs:
+                    authors.remove(*(current - authorIDs))
+                if authorIDs - current:
+                    authors.add(*(authorIDs - current))
+
         return UpdateBookMutation(book=book)
 
 
@@ -433,6 +596,93 @@ class DeleteBookMutation(graphene.Mutation):
         return DeleteBookMutation(bookID=bookID)
 
 
+"""
+Background Job Methods
+"""
+
+
+class StartImportMutation(graphene.Mutation):
+    job = graphene.Field(JobType)
+
+    def mutate(self, info):
+        job = enqueue("import_books")
+        return StartImportMutation(job=job)
+
+
+class DeletePublisherAsyncMutation(graphene.Mutation):
+    class Arguments:
+        publisherID = graphene.ID(required=True)
+
+    job = graphene.Field(JobType)
+
+    def mutate(self, info, publisherID):
+        if not Publisher.objects.filter(pk=publisherID).exists():
+            raise GraphQLError(f"Publisher with id {publisherID} does not exist")
+
+        job = enqueue("delete_publisher", publisher_id=int(publisherID))
+        return DeletePublisherAsyncMutation(job=job)
+
+
+"""
+Change-Feed Subscriptions
+"""
+
+
+class ChangeKind(graphene.Enum):
+    CREATED = "created"
+    UPDATED = "updated"
+    DELETED = "deleted"
+
+
+class BookChangedEvent(graphene.ObjectType):
+    id = graphene.ID()
+    mutation = graphene.Field(ChangeKind)
+    book = graphene.Field(BookType)
+
+    def resolve_book(root, info):
+        return Book.objects.filter(pk=root["id"]).first()
+
+
+class AuthorChangedEvent(graphene.ObjectType):
+    id = graphene.ID()
+    mutation = graphene.Field(ChangeKind)
+    author = graphene.Field(AuthorType)
+
+    def resolve_author(root, info):
+        return get_entities(Author, [root["id"]], info.context).get(int(root["id"]))
+
+
+class PublisherChangedEvent(graphene.ObjectType):
+    id = graphene.ID()
+    mutation = graphene.Field(ChangeKind)
+    publisher = graphene.Field(PublisherType)
+
+    def resolve_publisher(root, info):
+        return get_entities(Publisher, [root["id"]], info.context).get(int(root["id"]))
+
+
+async def listen_for_changes(topic, id=None):
+    async with aclosing(event_bus.listen(topic)) as events:
+        async for event in events:
+            if id is None or event["id"] == str(id):
+                yield event
+
+
+class Subscription(graphene.ObjectType):
+    bookChanged = graphene.Field(BookChangedEvent, id=graphene.ID())
+    authorChanged = graphene.Field(AuthorChangedEvent, id=graphene.ID())
+    publisherChanged = graphene.Field(PublisherChangedEvent, id=graphene.ID())
+
+    def subscribe_bookChanged(root, info, id=None):
+        return listen_for_changes("book", id)
+
+    def subscribe_authorChanged(root, info, id=None):
+        return listen_for_changes("author", id)
+
+    def subscribe_publisherChanged(root, info, id=None):
+        return listen_for_changes("publisher", id)
+
+
 # Mutation Class
 class Mutation(graphene.ObjectType):
     createPublisher = CreatePublisherMutation.Field()
@@ -444,6 +694,13 @@ class Mutation(graphene.ObjectType):
     deletePublisher = DeletePublisherMutation.Field()
     deleteAuthor = DeleteAuthorMutation.Field()
     deletBook = DeleteBookMutation.Field()
+    startImport = StartImportMutation.Field()
+    deletePublisherAsync = DeletePublisherAsyncMutation.Field()
 
 
-schema = graphene.Schema(query=Query, mutation=Mutation)
+schema = graphene.Schema(
+    query=Query,
+    mutation=Mutation,
+    subscription=Subscription,
+    directives=[*specified_directives, DeferDirective, StreamDirective],
+)
@@ -0,0 +1,55 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from books.autocomplete import index_instance, unindex
+from books.entity_cache import invalidate_on_commit
+from books.events import publish_change
+from books.models import Book, Publisher, Author
+
+
+# Connected first so cached rows are dropped before change events go out
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Publisher)
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Publisher)
+def invalidate_entity_cache(sender, instance, **kwargs):
+    invalidate_on_commit(sender, instance.pk)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Publisher)
+def publish_saved(sender, instance, created, **kwargs):
+    publish_change(sender, instance.pk, "created" if created else "updated")
+
+
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Publisher)
+def publish_deleted(sender, instance, **kwargs):
+    publish_change(sender, instance.pk, "deleted")
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+def publish_book_authors_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    # From the author side, pk_set holds the affected books
+    book_ids = (pk_set or ()) if reverse else [instance.pk]
+    for book_id in book_ids:
+        publish_change(Book, book_id, "updated")
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Author)
+def update_autocomplete(sender, instance, **kwargs):
+    transaction.on_commit(lambda: index_instance(instance))
+
+
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Author)
+def remove_from_autocomplete(sender, instance, **kwargs):
+    # delete() clears instance.pk before the commit
+    kind, pk = sender._meta.model_name, instance.pk
+    transaction.on_commit(lambda: unindex(kind, pk))
@@ -0,0 +1,185 @@
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from graphql import GraphQLError, parse, print_ast
+
+logger = logging.getLogger("books.slow_operations")
+
+string_literal = re.compile(r'"(?:[^"\\]|\\.)*"')
+number_literal = re.compile(r"([:\[,(]\s*)-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?\b")
+
+"""
+Normalization
+"""
+
+
+def normalize_query(query):
+    # Canonical formatting with literal values replaced, so operations that
+    # only differ in their arguments share a fingerprint
+    try:
+        query = print_ast(parse(query))
+    except GraphQLError:
+        pass
+    query = string_literal.sub('"?"', query)
+    return number_literal.sub(r"\1?", query)
+
+
+def fingerprint(operation_name, normalized_query):
+    digest = hashlib.sha1(f"{operation_name}:{normalized_query}".encode())
+    return digest.hexdigest()[:12]
+
+
+def redact(value, keys=None):
+    if keys is None:
+        keys = [key.lower() for key in getattr(settings, "SLOW_OPERATION_REDACT", [])]
+    if isinstance(value, dict):
+        return {
+            name: "[REDACTED]"
+            if any(key in name.lower() for key in keys)
+            else redact(item, keys)
+            for name, item in value.items()
+        }
+    if isinstance(value, list):
+        return [redact(item, keys) for item in value]
+    return value
+
+
+def explain(connection, sql, params):
+    prefix = {
+        "sqlite": "EXPLAIN QUERY PLAN ",
+        "postgresql": "EXPLAIN ",
+        "mysql": "EXPLAIN ",
+    }.get(connection.vendor)
+    if prefix is None:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            return [
+                " ".join(str(column) for column in row) for row in cursor.fetchall()
+            ]
+    except Exception as error:
+        return [f"EXPLAIN failed: {error}"]
+
+
+"""
+Recording
+"""
+
+
+class ResolverTimingMiddleware:
+    # Graphene middleware adding up the time spent in each resolver, list
+    # indices are dropped from the path so every book shares "books.title"
+    def __init__(self):
+        self.timings = defaultdict(lambda: [0, 0.0])
+
+    def resolve(self, next, root, info, **args):
+        start = time.perf_counter()
+        try:
+            return next(root, info, **args)
+        finally:
+            path = ".".join(
+                str(key) for key in info.path.as_list() if not isinstance(key, int)
+            )
+            timing = self.timings[path]
+            timing[0] += 1
+            timing[1] += time.perf_counter() - start
+
+
+class OperationRecorder:
+    def __init__(self, threshold_ms, resolver_timing=False):
+        # Timing every resolver costs a middleware call per field, so it is
+        # opt-in. Total time and SQL are always recorded.
+        self.threshold_ms = threshold_ms
+        self.middleware = ResolverTimingMiddleware() if resolver_timing else None
+        self.statements = []
+        self.exit_stack = ExitStack()
+        # Entered once per execution step, so time spent between steps
+        # (e.g. waiting on a streaming client) isn't counted
+        self.duration_ms = 0.0
+
+    def record_sql(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.statements.append(
+                {
+                    "alias": context["connection"].alias,
+                    "sql": sql,
+                    "params": params if not many else None,
+                    "duration_ms": (time.perf_counter() - start) * 1000,
+                }
+            )
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        for connection in connections.all():
+            self.exit_stack.enter_context(connection.execute_wrapper(self.record_sql))
+        return self
+
+    def __exit__(self, *exc_info):
+        self.duration_ms += (time.perf_counter() - self.start) * 1000
+        self.exit_stack.close()
+
+    def resolver_timings(self):
+        if self.middleware is None:
+            return {}
+        return {
+            path: {"calls": calls, "total_ms": round(seconds * 1000, 3)}
+            for path, (calls, seconds) in sorted(
+                self.middleware.timings.items(),
+                key=lambda item: item[1][1],
+                reverse=True,
+            )
+        }
+
+    def finish(self, query, variables, operation_name, result):
+        if self.duration_ms < self.threshold_ms:
+            return
+
+        # Plans are fetched once per distinct SELECT, after the operation so
+        # they don't count towards its time
+        plans = {}
+        for statement in self.statements:
+            sql = statement["sql"]
+            if sql.lstrip().upper().startswith("SELECT") and sql not in plans:
+                connection = connections[statement["alias"]]
+                plans[sql] = explain(connection, sql, statement["params"])
+
+        normalized = normalize_query(query or "")
+        record = {
+            "timestamp": time.time(),
+            "fingerprint": fingerprint(operation_name, normalized),
+            "operation_name": operation_name,
+            "duration_ms": round(self.duration_ms, 3),
+            "query": normalized,
+            "variables": redact(variables or {}),
+            "errors": [str(error) for error in (result.errors or [])] if result else [],
+            "resolvers": self.resolver_timings(),
+            "sql": [
+                {
+                    "sql": statement["sql"],
+                    "duration_ms": round(statement["duration_ms"], 3),
+                    "plan": plans.get(statement["sql"]),
+                }
+                for statement in self.statements
+            ],
+        }
+        logger.warning(json.dumps(record, default=str))
+
+
+def start_recording():
+    # Returns None when the slow-operation log is switched off
+    threshold_ms = getattr(settings, "SLOW_OPERATION_THRESHOLD_MS", None)
+    if threshold_ms is None:
+        return None
+    resolver_timing = getattr(settings, "SLOW_OPERATION_RESOLVER_TIMING", False)
+    return OperationRecorder(threshold_ms, resolver_timing)
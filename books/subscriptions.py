@@ -0,0 +1,153 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from graphql import (
+    ExecutionResult,
+    GraphQLError,
+    create_source_event_stream,
+    execute,
+    get_operation_ast,
+    parse,
+    validate,
+)
+from books.views import get_schema, get_validation_rules
+
+"""
+GraphQL over WebSocket
+
+Serves subscriptions with the graphql-transport-ws protocol. Events come from
+the async subscribe_* generators in books/schema.py, and each event is then
+resolved in a worker thread since resolvers use the (sync) Django ORM.
+Queries and mutations go through the HTTP view, which records and times them.
+"""
+
+PROTOCOL = "graphql-transport-ws"
+
+
+def format_result(result):
+    payload = {"data": result.data}
+    if result.errors:
+        payload["errors"] = [error.formatted for error in result.errors]
+    return payload
+
+
+class GraphQLWebSocketApp:
+    def __init__(self, path="/graphql/"):
+        self.path = path
+
+    async def __call__(self, scope, receive, send):
+        if scope["path"] != self.path:
+            await receive()
+            await send({"type": "websocket.close", "code": 4404})
+            return
+
+        operations = {}
+
+        async def send_json(message):
+            await send({"type": "websocket.send", "text": json.dumps(message)})
+
+        try:
+            while True:
+                message = await receive()
+
+                if message["type"] == "websocket.connect":
+                    await send({"type": "websocket.accept", "subprotocol": PROTOCOL})
+                elif message["type"] == "websocket.disconnect":
+                    break
+                elif message["type"] == "websocket.receive":
+                    try:
+                        data = json.loads(message.get("text") or message["bytes"])
+                    except ValueError:
+                        # A bad frame only drops that message
+                        continue
+                    if not isinstance(data, dict):
+                        continue
+                    kind = data.get("type")
+
+                    if kind == "connection_init":
+                        await send_json({"type": "connection_ack"})
+                    elif kind == "ping":
+                        await send_json({"type": "pong"})
+                    elif kind == "subscribe" and "id" in data:
+                        operations[data["id"]] = asyncio.create_task(
+                            self.run_operation(
+                                data["id"], data.get("payload", {}), send_json
+                            )
+                        )
+                    elif kind == "complete" and "id" in data:
+                        task = operations.pop(data["id"], None)
+                        if task:
+                            task.cancel()
+        finally:
+            for task in operations.values():
+                task.cancel()
+
+    async def run_operation(self, operation_id, payload, send_json):
+        schema = get_schema().graphql_schema
+        variables = payload.get("variables")
+        operation_name = payload.get("operationName")
+
+        try:
+            document = parse(payload.get("query", ""))
+        except GraphQLError as error:
+            await send_json(
+                {"type": "error", "id": operation_id, "payload": [error.formatted]}
+            )
+            return
+
+        errors = validate(schema, document, get_validation_rules())
+        if errors:
+            await send_json(
+                {
+                    "type": "error",
+                    "id": operation_id,
+                    "payload": [error.formatted for error in errors],
+                }
+            )
+            return
+
+        operation = get_operation_ast(document, operation_name)
+        if operation is None or operation.operation.value != "subscription":
+            error = GraphQLError("Only subscriptions are served over WebSocket")
+            await send_json(
+                {"type": "error", "id": operation_id, "payload": [error.formatted]}
+            )
+            return
+
+        def resolve(root_value):
+            return execute(
+                schema,
+                document,
+                root_value=root_value,
+                variable_values=variables,
+                operation_name=operation_name,
+            )
+
+        stream = await create_source_event_stream(
+            schema, document, variable_values=variables, operation_name=operation_name
+        )
+        if isinstance(stream, ExecutionResult):
+            await send_json(
+                {
+                    "type": "error",
+                    "id": operation_id,
+                    "payload": [error.formatted for error in stream.errors],
+                }
+            )
+            return
+
+        try:
+            async for event in stream:
+                result = await sync_to_async(resolve)(event)
+                await send_json(
+                    {
+                        "type": "next",
+                        "id": operation_id,
+                        "payload": format_result(result),
+                    }
+                )
+        finally:
+            await stream.aclose()
+
+        await send_json({"type": "complete", "id": operation_id})
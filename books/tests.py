@@ -1,3 +1,996 @@
-from django.test import TestCase
+import asyncio
+import json
+import logging
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import connection
+from django.db.models.signals import m2m_changed
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from graphql import get_introspection_query
+from books import autocomplete, entity_cache, jobs, slow_operations
+from books.admin import EstimatedCountPaginator, estimate_row_count
+from books.events import EventBus, event_bus, merge_event
+from books.incremental import plan_incremental
+from books.models import Book, Publisher, Author, Job
+from books.slow_operations import normalize_query, redact
+from books.subscriptions import GraphQLWebSocketApp
+from books.views import get_schema, is_introspection_query
+
+
+class GraphQLTestCase(TestCase):
+    def query(self, query, variables=None):
+        response = self.client.post(
+            "/graphql/",
+            json.dumps({"query": query, "variables": variables or {}}),
+            content_type="application/json",
+        )
+        return response.json()
+
+
+"""
+Partial Update Mutations
+"""
+
+
+class UpdateMutationTests(GraphQLTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.publisher = Publisher.objects.create(
+            name="Ace",
+            address="1 Main St",
+            city="New York",
+            state_province="NY",
+            country="USA",
+            website="https://ace.example.com",
+        )
+        cls.author = Author.objects.create(first_name="Roger", last_name="Zelazny")
+        cls.other_author = Author.objects.create(
+            first_name="Ursula", last_name="Le Guin"
+        )
+        cls.book = Book.objects.create(title="Lord of Light", publisher=cls.publisher)
+        cls.book.authors.add(cls.author)
+
+    def test_only_given_fields_change(self):
+        result = self.query(
+            'mutation { updateBook(bookID: %d, input: {title: "Creatures of Light"}) '
+            "{ book { title publisher { name } } } }" % self.book.pk
+        )
+        self.assertNotIn("errors", result)
+        book = result["data"]["updateBook"]["book"]
+        self.assertEqual(
+            book, {"title": "Creatures of Light", "publisher": {"name": "Ace"}}
+        )
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.publisher_id, self.publisher.pk)
+
+    def test_unselected_payload_skips_loading(self):
+        result = self.query(
+            'mutation { updatePublisher(publisherID: %d, input: {city: "Boston"}) '
+            "{ __typename } }" % self.publisher.pk
+        )
+        self.assertNotIn("errors", result)
+        self.publisher.refresh_from_db()
+        self.assertEqual(self.publisher.city, "Boston")
+
+    def test_unchanged_values_skip_the_write(self):
+        mutation = (
+            "mutation { updatePublisher(publisherID: %d, "
+            'input: {city: "New York", country: "USA"}) { __typename } }'
+            % self.publisher.pk
+        )
+        # One UPDATE that matches nothing, then the existence check
+        with self.captureOnCommitCallbacks() as callbacks:
+            with self.assertNumQueries(2):
+                result = self.query(mutation)
+        self.assertNotIn("errors", result)
+        self.assertEqual(callbacks, [])
+
+    def test_unchanged_selected_object_skips_the_write(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            result = self.query(
+                'mutation { updateBook(bookID: %d, input: {title: "Lord of Light"}) '
+                "{ book { title } } }" % self.book.pk
+            )
+        self.assertEqual(
+            result["data"]["updateBook"], {"book": {"title": "Lord of Light"}}
+        )
+        self.assertEqual(callbacks, [])
+
+    def test_payload_selected_through_named_fragment(self):
+        result = self.query(
+            'mutation { updateBook(bookID: %d, input: {title: "Isle of the Dead"}) '
+            "{ ...Payload } } "
+            "fragment Payload on UpdateBookMutation { book { title } }" % self.book.pk
+        )
+        self.assertEqual(
+            result["data"]["updateBook"], {"book": {"title": "Isle of the Dead"}}
+        )
+
+    def test_payload_selected_through_inline_fragment(self):
+        result = self.query(
+            'mutation { updateAuthor(authorID: %d, input: {firstName: "R."}) '
+            "{ ... on UpdateAuthorMutation { author { firstName lastName } } } }"
+            % self.author.pk
+        )
+        self.assertEqual(
+            result["data"]["updateAuthor"],
+            {"author": {"firstName": "R.", "lastName": "Zelazny"}},
+        )
+
+    def test_author_ids_replace_the_set(self):
+        result = self.query(
+            "mutation($id: ID!, $authors: [ID!]) { updateBook(bookID: $id, "
+            "input: {authorIDs: $authors}) { book { authors { lastName } } } }",
+            {"id": self.book.pk, "authors": [self.other_author.pk]},
+        )
+        self.assertNotIn("errors", result)
+        self.assertEqual(
+            list(self.book.authors.values_list("pk", flat=True)), [self.other_author.pk]
+        )
+
+    def test_null_for_required_column_is_rejected(self):
+        result = self.query(
+            "mutation { updateBook(bookID: %d, input: {title: null}) "
+            "{ book { title } } }" % self.book.pk
+        )
+        self.assertEqual(result["errors"][0]["message"], "title cannot be null")
+
+    def test_missing_row_is_an_error(self):
+        result = self.query(
+            'mutation { updateAuthor(authorID: 999999, input: {lastName: "X"}) '
+            "{ __typename } }"
+        )
+        self.assertEqual(
+            result["errors"][0]["message"], "Author with id 999999 does not exist"
+        )
+
+    def test_failed_author_diff_rolls_back_columns(self):
+        def fail(action, **kwargs):
+            if action == "pre_add":
+                raise RuntimeError("add failed")
+
+        m2m_changed.connect(fail, sender=Book.authors.through)
+        self.addCleanup(m2m_changed.disconnect, fail, sender=Book.authors.through)
+
+        result = self.query(
+            "mutation($id: ID!, $authors: [ID!]) { updateBook(bookID: $id, "
+            'input: {title: "Changed", authorIDs: $authors}) { book { title } } }',
+            {"id": self.book.pk, "authors": [self.other_author.pk]},
+        )
+        self.assertEqual(result["errors"][0]["message"], "add failed")
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.title, "Lord of Light")
+        self.assertEqual(
+            list(self.book.authors.values_list("pk", flat=True)), [self.author.pk]
+        )
+
+
+"""
+Autocomplete
+"""
+
+
+class AutocompleteTests(GraphQLTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Book.objects.create(title="Lord of Light")
+        Book.objects.create(title="The Lord of the Rings")
+        Author.objects.create(first_name="Roger", last_name="Zelazny")
+
+    def setUp(self):
+        # Built from this test's rows on first use
+        patcher = mock.patch.object(autocomplete, "index", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_full_matches_come_before_word_matches(self):
+        result = self.query('{ autocomplete(prefix: "lo") { kind text } }')
+        self.assertEqual(
+            result["data"]["autocomplete"],
+            [
+                {"kind": "BOOK", "text": "Lord of Light"},
+                {"kind": "BOOK", "text": "The Lord of the Rings"},
+            ],
+        )
+
+    def test_null_limit_uses_the_default(self):
+        result = self.query('{ autocomplete(prefix: "zel", limit: null) { text } }')
+        self.assertNotIn("errors", result)
+        self.assertEqual(result["data"]["autocomplete"], [{"text": "Roger Zelazny"}])
+
+    def test_changes_during_a_rebuild_are_replayed(self):
+        old_index = autocomplete.get_index()
+        zelazny = Author.objects.get()
+
+        def scan_entries():
+            yield from original_scan_entries()
+            # Written after the scan read the tables
+            with self.captureOnCommitCallbacks(execute=True):
+                Book.objects.create(title="Lord of Chaos")
+                zelazny.delete()
+
+        original_scan_entries = autocomplete.scan_entries
+        with mock.patch.object(autocomplete, "scan_entries", scan_entries):
+            autocomplete.rebuild()
+
+        self.assertIsNot(autocomplete.get_index(), old_index)
+        self.assertEqual(
+            [text for _, _, text in autocomplete.get_index().search("lord of")],
+            ["Lord of Chaos", "Lord of Light", "The Lord of the Rings"],
+        )
+        self.assertEqual(autocomplete.get_index().search("zel"), [])
+        self.assertIsNone(autocomplete.pending_changes)
+
+    @override_settings(AUTOCOMPLETE_REBUILD_INTERVAL=0)
+    def test_stale_index_is_rebuilt_in_the_background(self):
+        current = autocomplete.get_index()
+        with mock.patch.object(autocomplete.threading, "Thread") as thread:
+            self.addCleanup(autocomplete.build_lock.release)
+            self.assertIs(autocomplete.get_index(), current)
+            self.assertIs(autocomplete.get_index(), current)
+        thread.assert_called_once_with(target=autocomplete.run_rebuild, daemon=True)
+
+
+"""
+Incremental Delivery
+"""
+
+
+class IncrementalDeliveryTests(GraphQLTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [
+            Author.objects.create(first_name="Roger", last_name="Zelazny"),
+            Author.objects.create(first_name="Ursula", last_name="Le Guin"),
+        ]
+        cls.books = [Book.objects.create(title=f"Book {i}") for i in range(3)]
+        cls.books[1].authors.add(*cls.authors)
+
+    def multipart(self, query):
+        response = self.client.post(
+            "/graphql/",
+            json.dumps({"query": query}),
+            content_type="application/json",
+            HTTP_ACCEPT="multipart/mixed",
+        )
+        self.assertTrue(response.streaming)
+        body = b"".join(response.streaming_content).decode()
+        parts = body.split("\r\n---")[1:-1]
+        return [json.loads(part.split("\r\n\r\n", 1)[1]) for part in parts]
+
+    def test_defer_sends_fragment_per_object(self):
+        with self.assertNumQueries(1):
+            initial, deferred = self.multipart("{ books { id ... @defer { title } } }")
+
+        self.assertEqual(
+            initial,
+            {
+                "data": {"books": [{"id": str(book.pk)} for book in self.books]},
+                "hasNext": True,
+            },
+        )
+        self.assertEqual(
+            deferred,
+            {
+                "hasNext": False,
+                "incremental": [
+                    {"data": {"title": book.title}, "path": ["books", index]}
+                    for index, book in enumerate(self.books)
+                ],
+            },
+        )
+
+    def test_defer_named_fragment_with_label(self):
+        _, deferred = self.multipart(
+            '{ books { id ...Title @defer(label: "title") } } '
+            "fragment Title on BookType { title }"
+        )
+        self.assertEqual(
+            deferred["incremental"][0],
+            {"data": {"title": "Book 0"}, "path": ["books", 0], "label": "title"},
+        )
+
+    def test_stream_at_root(self):
+        initial, streamed = self.multipart(
+            "{ books @stream(initialCount: 1) { title } }"
+        )
+        self.assertEqual(initial["data"], {"books": [{"title": "Book 0"}]})
+        self.assertEqual(
+            streamed["incremental"],
+            [
+                {
+                    "items": [{"title": "Book 1"}, {"title": "Book 2"}],
+                    "path": ["books", 1],
+                }
+            ],
+        )
+
+    def test_stream_continues_after_last_sent_row(self):
+        # A row deleted between the payloads must not shift the remaining items
+        operation = "{ books @stream(initialCount: 2) { title } }"
+        plan = plan_incremental(get_schema().graphql_schema, operation)
+        payloads = plan.execute()
+        self.assertEqual(len(next(payloads)["data"]["books"]), 2)
+        self.books[0].delete()
+        self.assertEqual(
+            next(payloads)["incremental"],
+            [{"items": [{"title": "Book 2"}], "path": ["books", 2]}],
+        )
+
+    def test_nested_stream(self):
+        initial, streamed = self.multipart(
+            "{ books { title authors @stream(initialCount: 1) { lastName } } }"
+        )
+        self.assertEqual(
+            initial["data"]["books"][1],
+            {"title": "Book 1", "authors": [{"lastName": "Zelazny"}]},
+        )
+        self.assertEqual(
+            streamed["incremental"],
+            [{"items": [{"lastName": "Le Guin"}], "path": ["books", 1, "authors", 1]}],
+        )
+
+    def test_disabled_directives_use_a_normal_response(self):
+        response = self.client.post(
+            "/graphql/",
+            json.dumps(
+                {"query": "{ books @stream(if: false, initialCount: 1) { id } }"}
+            ),
+            content_type="application/json",
+            HTTP_ACCEPT="multipart/mixed",
+        )
+        self.assertFalse(response.streaming)
+        self.assertEqual(len(response.json()["data"]["books"]), 3)
+
+    @override_settings(GRAPHQL_INTROSPECTION=False)
+    def test_view_validation_rules_apply(self):
+        response = self.client.post(
+            "/graphql/",
+            json.dumps(
+                {
+                    "query": "{ __schema { queryType { name } } "
+                    "books @stream(initialCount: 1) { id } }"
+                }
+            ),
+            content_type="application/json",
+            HTTP_ACCEPT="multipart/mixed",
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_stream_requires_a_list_field(self):
+        for query in (
+            "{ books { title @stream(initialCount: 2) } }",
+            "{ books { publisher @stream(initialCount: 1) { name } } }",
+        ):
+            with self.subTest(query=query):
+                self.assertIsNone(plan_incremental(get_schema().graphql_schema, query))
+                response = self.client.post(
+                    "/graphql/",
+                    json.dumps({"query": query}),
+                    content_type="application/json",
+                    HTTP_ACCEPT="multipart/mixed",
+                )
+                self.assertFalse(response.streaming)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(
+                    "@stream can only be used on list fields",
+                    response.json()["errors"][0]["message"],
+                )
+
+
+"""
+Entity Cache
+"""
+
+
+class EntityCacheTests(GraphQLTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.publisher = Publisher.objects.create(
+            name="Ace",
+            address="1 Main St",
+            city="New York",
+            state_province="NY",
+            country="USA",
+            website="https://ace.example.com",
+        )
+
+    def setUp(self):
+        entity_cache.clear()
+        self.addCleanup(entity_cache.clear)
+
+    def test_cached_rows_are_reused(self):
+        entity_cache.get_entity(Publisher, self.publisher.pk)
+        with self.assertNumQueries(0):
+            publisher = entity_cache.get_entity(Publisher, self.publisher.pk)
+        self.assertEqual(publisher.name, "Ace")
+
+    def test_saving_invalidates(self):
+        entity_cache.get_entity(Publisher, self.publisher.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            Publisher.objects.filter(pk=self.publisher.pk).first().save()
+        with self.assertNumQueries(1):
+            entity_cache.get_entity(Publisher, self.publisher.pk)
+
+    def test_writes_compare_against_the_database(self):
+        # Another process renamed the row without this process hearing of it
+        entity_cache.get_entity(Publisher, self.publisher.pk)
+        Publisher.objects.filter(pk=self.publisher.pk).update(name="Bantam")
+
+        result = self.query(
+            'mutation { updatePublisher(publisherID: %d, input: {name: "Ace"}) '
+            "{ publisher { name } } }" % self.publisher.pk
+        )
+        self.assertEqual(
+            result["data"]["updatePublisher"], {"publisher": {"name": "Ace"}}
+        )
+        self.publisher.refresh_from_db()
+        self.assertEqual(self.publisher.name, "Ace")
+
+    def test_book_list_relations_are_batched(self):
+        author = Author.objects.create(first_name="Roger", last_name="Zelazny")
+        for i in range(3):
+            Book.objects.create(title=f"Book {i}", publisher=self.publisher)
+            Book.objects.get(title=f"Book {i}").authors.add(author)
+
+        # One query for the books with their publishers, one for the authors
+        with self.assertNumQueries(2):
+            result = self.query(
+                "{ books { title publisher { name } authors { lastName } } }"
+            )
+        self.assertEqual(
+            result["data"]["books"][0],
+            {
+                "title": "Book 0",
+                "publisher": {"name": "Ace"},
+                "authors": [{"lastName": "Zelazny"}],
+            },
+        )
+
+    def test_create_book_looks_up_rows_through_the_cache(self):
+        author = Author.objects.create(first_name="Roger", last_name="Zelazny")
+        entity_cache.get_entities(Author, [author.pk])
+        entity_cache.get_entity(Publisher, self.publisher.pk)
+
+        with mock.patch.object(
+            Publisher.objects, "get", side_effect=AssertionError
+        ), mock.patch.object(Author.objects, "get", side_effect=AssertionError):
+            result = self.query(
+                'mutation { createBook(title: "Lord of Light", authorID: %d, '
+                'publisherID: %d, publicationDate: "1967-01-01") '
+                "{ book { title } } }" % (author.pk, self.publisher.pk)
+            )
+        self.assertEqual(
+            result["data"]["createBook"], {"book": {"title": "Lord of Light"}}
+        )
+        self.assertEqual(entity_cache.stats["process_hits"], 2)
+
+
+"""
+Admin
+"""
+
+
+class PrefixSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for title in ["Lord of Light", "lord of the rings", "Lorax", "Dune", "100%"]:
+            Book.objects.create(title=title)
+
+    def titles(self, prefix):
+        return sorted(
+            Book.objects.filter(title__iprefix=prefix).values_list("title", flat=True)
+        )
+
+    def test_matches_prefix_ignoring_case(self):
+        self.assertEqual(
+            self.titles("LOR"), ["Lorax", "Lord of Light", "lord of the rings"]
+        )
+        self.assertEqual(self.titles("lord of t"), ["lord of the rings"])
+        self.assertEqual(self.titles("x"), [])
+
+    def test_wildcards_are_literal(self):
+        self.assertEqual(self.titles("100%"), ["100%"])
+        self.assertEqual(self.titles("%"), [])
+
+    def test_uses_the_lower_index(self):
+        queryset = Book.objects.filter(title__iprefix="lo")
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            plan = " ".join(str(row) for row in cursor.fetchall())
+        self.assertIn("books_book_title_lower", plan)
+
+    def test_other_backends_fall_back_to_istartswith(self):
+        query = Book.objects.filter(title__iprefix="lo").query
+        lookup = query.where.children[0]
+        sql, params = lookup.as_sql(query.get_compiler("default"), connection)
+        self.assertIn("LIKE", sql)
+        self.assertEqual(params, ["lo%"])
+
+    def test_admin_search(self):
+        user = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.client.force_login(user)
+        response = self.client.get("/admin/books/book/", {"q": "lor"})
+        self.assertEqual(response.context["cl"].result_count, 3)
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Book.objects.bulk_create(Book(title=f"Book {i}") for i in range(5))
+
+    def test_sqlite_counts_exactly(self):
+        self.assertIsNone(estimate_row_count(Book.objects.all()))
+        self.assertEqual(
+            EstimatedCountPaginator(Book.objects.order_by("pk"), 2).count, 5
+        )
+
+    def test_large_tables_use_the_estimate(self):
+        with mock.patch("books.admin.estimate_row_count", return_value=50000):
+            paginator = EstimatedCountPaginator(Book.objects.order_by("pk"), 2)
+            self.assertEqual(paginator.count, 50000)
+
+    def test_small_estimates_and_filters_count_exactly(self):
+        with mock.patch("books.admin.estimate_row_count", return_value=50):
+            self.assertEqual(
+                EstimatedCountPaginator(Book.objects.order_by("pk"), 2).count, 5
+            )
+        with mock.patch("books.admin.estimate_row_count", return_value=50000):
+            filtered = Book.objects.filter(title__iprefix="book 1").order_by("pk")
+            self.assertEqual(EstimatedCountPaginator(filtered, 2).count, 1)
+
+
+"""
+Background Jobs
+"""
+
+
+class JobQueueTests(GraphQLTestCase):
+    def setUp(self):
+        self.runs = []
+        handlers = {
+            "record": lambda job, **payload: self.runs.append(payload),
+            "unsafe": lambda job: 1 / 0,
+            "refused": self.refuse,
+        }
+        patcher = mock.patch.dict(jobs.handlers, handlers)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def refuse(self, job):
+        raise jobs.JobError("Nothing to import")
+
+    def make_stale(self, job):
+        Job.objects.filter(pk=job.pk).update(
+            heartbeat_at=timezone.now() - timedelta(hours=1)
+        )
+
+    def test_claims_oldest_queued_job_once(self):
+        first = jobs.enqueue("record", n=1)
+        jobs.enqueue("record", n=2)
+
+        claimed = jobs.claim_next_job()
+        self.assertEqual(claimed.pk, first.pk)
+        self.assertEqual(claimed.status, Job.Status.RUNNING)
+        self.assertEqual(claimed.attempts, 1)
+        self.assertNotEqual(jobs.claim_next_job().pk, first.pk)
+        self.assertIsNone(jobs.claim_next_job())
+
+    def test_unknown_kind_is_rejected(self):
+        with self.assertRaises(ValueError):
+            jobs.enqueue("nope")
+
+    def test_successful_run(self):
+        job = jobs.enqueue("record", n=1)
+        jobs.run_job(jobs.claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.SUCCEEDED)
+        self.assertEqual(self.runs, [{"n": 1}])
+
+    def test_error_messages_are_client_safe(self):
+        refused = jobs.enqueue("refused")
+        jobs.run_job(jobs.claim_next_job())
+        refused.refresh_from_db()
+        self.assertEqual(
+            (refused.status, refused.error), (Job.Status.FAILED, "Nothing to import")
+        )
+
+        unsafe = jobs.enqueue("unsafe")
+        with self.assertLogs("books.jobs", "ERROR"):
+            jobs.run_job(jobs.claim_next_job())
+        unsafe.refresh_from_db()
+        self.assertEqual(
+            (unsafe.status, unsafe.error), (Job.Status.FAILED, "Internal error")
+        )
+
+    def test_stale_job_is_requeued(self):
+        job = jobs.enqueue("record")
+        self.make_stale(jobs.claim_next_job())
+
+        claimed = jobs.claim_next_job()
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual(claimed.attempts, 2)
+
+    @override_settings(JOB_MAX_ATTEMPTS=2)
+    def test_stale_job_fails_after_max_attempts(self):
+        job = jobs.enqueue("record")
+        self.make_stale(jobs.claim_next_job())
+        self.make_stale(jobs.claim_next_job())
+
+        self.assertIsNone(jobs.claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertEqual(job.error, "The worker running this job stopped responding")
+
+    def test_previous_run_cannot_overwrite_new_run(self):
+        jobs.enqueue("record")
+        old_run = jobs.claim_next_job()
+        self.make_stale(old_run)
+        new_run = jobs.claim_next_job()
+
+        with self.assertRaises(Job.LeaseLost):
+            old_run.report(1)
+        with self.assertLogs("books.jobs", "WARNING"):
+            jobs.run_job(old_run)
+        new_run.refresh_from_db()
+        self.assertEqual(new_run.status, Job.Status.RUNNING)
+
+        jobs.run_job(new_run)
+        new_run.refresh_from_db()
+        self.assertEqual(new_run.status, Job.Status.SUCCEEDED)
+
+    def test_delete_publisher_job(self):
+        publisher = Publisher.objects.create(
+            name="Ace",
+            address="1 Main St",
+            city="New York",
+            state_province="NY",
+            country="USA",
+            website="https://ace.example.com",
+        )
+        Book.objects.bulk_create(
+            Book(title=f"Book {i}", publisher=publisher) for i in range(5)
+        )
+
+        result = self.query(
+            "mutation { deletePublisherAsync(publisherID: %d) { job { id status } } }"
+            % publisher.pk
+        )
+        job = result["data"]["deletePublisherAsync"]["job"]
+        self.assertEqual(job["status"], "QUEUED")
+
+        job = jobs.claim_next_job()
+        job.payload["batch_size"] = 2
+        jobs.run_job(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress, job.total), ("succeeded", 5, 5))
+        self.assertFalse(Publisher.objects.filter(pk=publisher.pk).exists())
+
+        result = self.query(
+            "mutation { deletePublisherAsync(publisherID: %d) { job { id } } }"
+            % publisher.pk
+        )
+        self.assertEqual(
+            result["errors"][0]["message"],
+            f"Publisher with id {publisher.pk} does not exist",
+        )
+
+    def test_start_import_takes_no_url(self):
+        result = self.query("mutation { startImport { job { id kind status } } }")
+        job = Job.objects.get(pk=result["data"]["startImport"]["job"]["id"])
+        self.assertEqual((job.kind, job.payload), ("import_books", {}))
+
+        result = self.query(
+            'mutation { startImport(url: "http://127.0.0.1:9/") { job { id } } }'
+        )
+        self.assertIn("Unknown argument 'url'", result["errors"][0]["message"])
+
+    def test_job_query_hides_internals(self):
+        job = jobs.enqueue("refused")
+        jobs.run_job(jobs.claim_next_job())
+
+        result = self.query("{ job(id: %d) { kind status progress error } }" % job.pk)
+        self.assertEqual(
+            result["data"]["job"],
+            {
+                "kind": "refused",
+                "status": "FAILED",
+                "progress": 0,
+                "error": "Nothing to import",
+            },
+        )
+        result = self.query("{ job(id: %d) { payload } }" % job.pk)
+        self.assertIn("Cannot query field 'payload'", result["errors"][0]["message"])
+
+
+"""
+Introspection
+"""
+
+
+@override_settings(GRAPHQL_INTROSPECTION=True)
+class IntrospectionTests(GraphQLTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_introspection_is_cached(self):
+        query = get_introspection_query()
+        with mock.patch.object(
+            get_schema(), "execute", wraps=get_schema().execute
+        ) as execute:
+            first = self.query(query)
+            second = self.query(query)
+
+        self.assertEqual(execute.call_count, 1)
+        self.assertEqual(first, second)
+        self.assertIn("__schema", first["data"])
+
+    def test_fragment_spreads_are_not_introspection(self):
+        query = "query { ...__F } fragment __F on Query { books { title } }"
+        self.assertFalse(is_introspection_query(query))
+        self.assertTrue(
+            is_introspection_query("{ __typename __schema { __typename } }")
+        )
+
+    def test_variables_are_not_cached(self):
+        query = "query ($name: String!) { __type(name: $name) { name } }"
+        for name in ("BookType", "AuthorType"):
+            result = self.query(query, {"name": name})
+            self.assertEqual(result["data"]["__type"]["name"], name)
+
+    @override_settings(GRAPHQL_INTROSPECTION=False)
+    def test_disabled_introspection_is_rejected(self):
+        result = self.query(get_introspection_query())
+        self.assertNotIn("data", result)
+        self.assertIn("introspection", result["errors"][0]["message"])
+        self.assertEqual(self.query("{ __typename }")["data"], {"__typename": "Query"})
+
+
+"""
+Change-Feed Subscriptions
+"""
+
+
+class EventBusTests(TestCase):
+    def test_merge_keeps_one_event_per_row(self):
+        pending = {}
+        for event in (
+            {"id": "1", "mutation": "created"},
+            {"id": "1", "mutation": "updated"},
+            {"id": "2", "mutation": "updated"},
+            {"id": "2", "mutation": "deleted"},
+        ):
+            merge_event(pending, event)
+        self.assertEqual(
+            list(pending.values()),
+            [{"id": "1", "mutation": "created"}, {"id": "2", "mutation": "deleted"}],
+        )
+
+    async def test_listen_coalesces_bursts(self):
+        bus = EventBus()
+        events = bus.listen("book", window=0.05)
+        first = asyncio.ensure_future(events.__anext__())
+        while not bus.subscribers.get("book"):
+            await asyncio.sleep(0)
+
+        for mutation in ("created", "updated", "updated"):
+            bus.publish("book", {"id": "1", "mutation": mutation})
+        bus.publish("book", {"id": "2", "mutation": "updated"})
+
+        received = [await first, await events.__anext__()]
+        await events.aclose()
+        self.assertEqual(
+            received,
+            [{"id": "1", "mutation": "created"}, {"id": "2", "mutation": "updated"}],
+        )
+        self.assertEqual(bus.subscribers["book"], set())
+
+
+class WebSocketTests(GraphQLTestCase):
+    async def connect(self):
+        app = ApplicationCommunicator(
+            GraphQLWebSocketApp(), {"type": "websocket", "path": "/graphql/"}
+        )
+        await app.send_input({"type": "websocket.connect"})
+        self.assertEqual((await app.receive_output(1))["type"], "websocket.accept")
+        await self.send(app, {"type": "connection_init"})
+        self.assertEqual(await self.receive(app), {"type": "connection_ack"})
+        return app
+
+    async def send(self, app, message):
+        await app.send_input({"type": "websocket.receive", "text": json.dumps(message)})
+
+    async def receive(self, app):
+        return json.loads((await app.receive_output(1))["text"])
+
+    async def disconnect(self, app):
+        await app.send_input({"type": "websocket.disconnect", "code": 1000})
+        await app.wait(1)
+
+    def create_author(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.query(
+                'mutation { createAuthor(firstName: "Ada", lastName: "Lovelace", '
+                'email: "ada@example.com") { author { id } } }'
+            )
+
+    async def test_subscription_receives_mutation(self):
+        app = await self.connect()
+        await self.send(app, {"type": "ping"})
+        await app.send_input({"type": "websocket.receive", "text": "{not json"})
+        self.assertEqual(await self.receive(app), {"type": "pong"})
+
+        await self.send(
+            app,
+            {
+                "id": "1",
+                "type": "subscribe",
+                "payload": {
+                    "query": "subscription { authorChanged "
+                    "{ mutation author { lastName } } }"
+                },
+            },
+        )
+        while not event_bus.subscribers.get("author"):
+            await asyncio.sleep(0)
+        await sync_to_async(self.create_author)()
+
+        self.assertEqual(
+            await self.receive(app),
+            {
+                "id": "1",
+                "type": "next",
+                "payload": {
+                    "data": {
+                        "authorChanged": {
+                            "mutation": "CREATED",
+                            "author": {"lastName": "Lovelace"},
+                        }
+                    }
+                },
+            },
+        )
+        await self.send(app, {"id": "1", "type": "complete"})
+        await self.disconnect(app)
+
+    async def test_queries_are_not_served(self):
+        app = await self.connect()
+        await self.send(
+            app,
+            {"id": "1", "type": "subscribe", "payload": {"query": "{ books { id } }"}},
+        )
+        message = await self.receive(app)
+        self.assertEqual(message["type"], "error")
+        self.assertEqual(
+            message["payload"][0]["message"],
+            "Only subscriptions are served over WebSocket",
+        )
+        await self.disconnect(app)
+
+    @override_settings(GRAPHQL_INTROSPECTION=False)
+    async def test_validation_rules_match_http(self):
+        app = await self.connect()
+        await self.send(
+            app,
+            {
+                "id": "1",
+                "type": "subscribe",
+                "payload": {"query": "subscription { __schema { types { name } } }"},
+            },
+        )
+        message = await self.receive(app)
+        self.assertEqual(message["type"], "error")
+        self.assertIn("introspection", message["payload"][0]["message"])
+        await self.disconnect(app)
+
+
+"""
+Slow-Operation Log
+"""
+
+
+class SlowOperationTests(GraphQLTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(title="Lord of Light")
+
+    def setUp(self):
+        # Records go to a temporary file instead of SLOW_OPERATION_LOG
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.log = Path(directory.name) / "slow.jsonl"
+        handler = logging.FileHandler(self.log, encoding="utf-8")
+        self.addCleanup(handler.close)
+        patcher = mock.patch.object(slow_operations.logger, "handlers", [handler])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def records(self):
+        if not self.log.exists():
+            return []
+        return [json.loads(line) for line in self.log.read_text().splitlines()]
+
+    def test_normalize_query(self):
+        first = normalize_query('{ book(id: 1) { title } search(q: "lord") { id } }')
+        second = normalize_query('{book(id:22){title} search(q:"x"){id}}')
+        self.assertEqual(first, second)
+        self.assertIn('search(q: "?")', first)
+        self.assertIn("book(id: ?)", first)
+
+    @override_settings(SLOW_OPERATION_REDACT=["password", "email"])
+    def test_redact(self):
+        self.assertEqual(
+            redact({"userEmail": "a@b.c", "input": [{"Password": "x", "name": "y"}]}),
+            {
+                "userEmail": "[REDACTED]",
+                "input": [{"Password": "[REDACTED]", "name": "y"}],
+            },
+        )
+
+    @override_settings(SLOW_OPERATION_THRESHOLD_MS=60_000)
+    def test_fast_operations_are_not_logged(self):
+        self.query("{ books { title } }")
+        self.assertEqual(self.records(), [])
+
+    @override_settings(
+        SLOW_OPERATION_THRESHOLD_MS=0, SLOW_OPERATION_RESOLVER_TIMING=True
+    )
+    def test_slow_operation_record(self):
+        self.query(
+            "query Books($search: String) " "{ books(search: $search) { title } }",
+            {"search": "Lord", "email": "a@b.c"},
+        )
+
+        [record] = self.records()
+        self.assertTrue(record["query"].startswith("query Books($search: String"))
+        self.assertEqual(len(record["fingerprint"]), 12)
+        self.assertEqual(record["variables"], {"search": "Lord", "email": "[REDACTED]"})
+        self.assertEqual(record["errors"], [])
+        self.assertEqual(record["resolvers"]["books.title"]["calls"], 1)
+        self.assertGreaterEqual(record["duration_ms"], 0)
+        [statement] = record["sql"]
+        self.assertIn("books_book", statement["sql"])
+        # EXPLAIN QUERY PLAN on SQLite
+        self.assertTrue(statement["plan"])
+
+    @override_settings(SLOW_OPERATION_THRESHOLD_MS=0)
+    def test_multipart_time_excludes_waiting_on_the_client(self):
+        response = self.client.post(
+            "/graphql/",
+            json.dumps({"query": "{ books { id ... @defer { title } } }"}),
+            content_type="application/json",
+            HTTP_ACCEPT="multipart/mixed",
+        )
+        chunks = iter(response.streaming_content)
+        next(chunks), next(chunks)  # Boundary and the initial payload
+        time.sleep(0.3)  # Client reading slowly
+        list(chunks)
+
+        [record] = self.records()
+        self.assertLess(record["duration_ms"], 300)
+
+    def test_slow_ops_groups_by_fingerprint(self):
+        with override_settings(SLOW_OPERATION_THRESHOLD_MS=0):
+            for search in ("Lord", "Light"):
+                self.query('{ books(search: "%s") { title } }' % search)
+            self.query("{ authors { lastName } }")
+
+        out = StringIO()
+        call_command("slow_ops", log=str(self.log), stdout=out)
+        summaries = [line for line in out.getvalue().splitlines() if "calls," in line]
+        self.assertEqual(
+            sorted(line.split(": ")[1].split(",")[0] for line in summaries),
+            ["1 calls", "2 calls"],
+        )
@@ -1,3 +1,277 @@
-from django.shortcuts import render
+import datetime
+import hashlib
+import json
+from contextlib import nullcontext
+from functools import lru_cache
 
-# Create your views here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from graphene_django.settings import graphene_settings
+from graphene_django.views import GraphQLView, HttpError
+from graphql import ExecutionResult, GraphQLError, get_introspection_query, parse
+from graphql.language import FieldNode, OperationDefinitionNode
+from graphql.validation import NoSchemaIntrospectionCustomRule
+from books.incremental import incremental_rules, plan_incremental
+from books.slow_operations import start_recording
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the stdlib encoder is used without it
+    orjson = None
+
+
+"""
+JSON Encoding
+"""
+
+
+def encode_default(value):
+    # Date scalars are serialized to ISO strings by graphene, this only catches
+    # raw date values that reach the encoder without going through a scalar
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def json_dumps(data, pretty=False):
+    # Website and Email scalars serialize to plain strings, so both encoders
+    # handle them without any custom hooks
+    if orjson is not None:
+        option = orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS if pretty else 0
+        return orjson.dumps(data, default=encode_default, option=option).decode()
+
+    if pretty:
+        return json.dumps(
+            data,
+            default=encode_default,
+            sort_keys=True,
+            indent=2,
+            separators=(",", ": "),
+        )
+    return json.dumps(data, default=encode_default, separators=(",", ":"))
+
+
+"""
+Schema Loading and Introspection
+"""
+
+
+def get_schema():
+    # graphene_settings imports GRAPHENE["SCHEMA"] on first access, so the
+    # schema is only built by the first request (or by prebuild_schema)
+    return graphene_settings.SCHEMA
+
+
+def introspection_enabled():
+    return getattr(settings, "GRAPHQL_INTROSPECTION", settings.DEBUG)
+
+
+def get_validation_rules():
+    # Shared by the HTTP view and the WebSocket app
+    if introspection_enabled():
+        return incremental_rules
+    return (*incremental_rules, NoSchemaIntrospectionCustomRule)
+
+
+@lru_cache(maxsize=None)
+def schema_version(schema):
+    return hashlib.sha256(str(schema).encode()).hexdigest()[:16]
+
+
+INTROSPECTION_FIELDS = {"__schema", "__type", "__typename"}
+
+
+def is_introspection_query(query, operation_name=None):
+    # Cheap text check first, only queries mentioning __schema/__type get parsed
+    if "__schema" not in query and "__type" not in query:
+        return False
+    try:
+        document = parse(query)
+    except GraphQLError:
+        return False
+
+    operations = [
+        definition
+        for definition in document.definitions
+        if isinstance(definition, OperationDefinitionNode)
+    ]
+    if operation_name:
+        operations = [
+            operation
+            for operation in operations
+            if operation.name and operation.name.value == operation_name
+        ]
+    if len(operations) != 1 or operations[0].operation.value != "query":
+        return False
+
+    # Fragment spreads and inline fragments can select regular fields, so
+    # only plain introspection fields count
+    return all(
+        isinstance(selection, FieldNode)
+        and selection.name.value in INTROSPECTION_FIELDS
+        for selection in operations[0].selection_set.selections
+    )
+
+
+def introspection_cache_key(schema, query, operation_name=None):
+    digest = hashlib.sha256(f"{operation_name}:{query}".encode()).hexdigest()
+    return f"graphql-introspection:{schema_version(schema)}:{digest}"
+
+
+def get_introspection(schema, query, operation_name=None, variables=None):
+    # Introspection results only change with the schema, so they are cached
+    # per schema version and query text. Queries with variables aren't
+    # cached, and entries expire so arbitrary query texts don't pile up
+    if variables:
+        return schema.execute(
+            query, operation_name=operation_name, variable_values=variables
+        )
+
+    key = introspection_cache_key(schema, query, operation_name)
+    data = cache.get(key)
+    if data is None:
+        result = schema.execute(query, operation_name=operation_name)
+        if result.errors:
+            return result
+        data = result.data
+        cache.set(key, data, timeout=settings.GRAPHQL_INTROSPECTION_CACHE_TIMEOUT)
+    return ExecutionResult(data=data)
+
+
+def prebuild_schema():
+    # Builds the schema and precomputes the standard introspection result,
+    # meant to run at deploy time or before forking workers
+    schema = get_schema()
+    if introspection_enabled():
+        get_introspection(schema, get_introspection_query())
+    return schema
+
+
+"""
+GraphQL View
+"""
+
+
+async def iterate_in_thread(iterator):
+    # Django collects a sync streaming iterator completely before sending it
+    # under ASGI, so each chunk is produced in the sync thread (which holds
+    # the request's database connection) and sent as soon as it is ready
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    try:
+        while (chunk := await next_chunk(iterator, None)) is not None:
+            yield chunk
+    finally:
+        await sync_to_async(iterator.close, thread_sensitive=True)()
+
+
+class BookstoreGraphQLView(GraphQLView):
+    encoder = staticmethod(json_dumps)
+    recorder = None
+
+    def __init__(self, schema=None, validation_rules=None, **kwargs):
+        if validation_rules is None:
+            validation_rules = get_validation_rules()
+        super().__init__(
+            schema=schema or get_schema(), validation_rules=validation_rules, **kwargs
+        )
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        if (
+            query
+            and introspection_enabled()
+            and is_introspection_query(query, operation_name)
+        ):
+            return get_introspection(self.schema, query, operation_name, variables)
+
+        self.recorder = start_recording()
+        if self.recorder is None:
+            return super().execute_graphql_request(
+                request, data, query, variables, operation_name, show_graphiql
+            )
+
+        with self.recorder:
+            result = super().execute_graphql_request(
+                request, data, query, variables, operation_name, show_graphiql
+            )
+        self.recorder.finish(query, variables, operation_name, result)
+        return result
+
+    def dispatch(self, request, *args, **kwargs):
+        # Queries using @defer/@stream get a multipart response when the
+        # client accepts one, everything else goes through the normal path
+        if (
+            request.method.lower() in ("get", "post")
+            and not self.batch
+            and "multipart/mixed" in request.headers.get("Accept", "")
+        ):
+            try:
+                data = self.parse_body(request)
+                query, variables, operation_name, _ = self.get_graphql_params(
+                    request, data
+                )
+            except HttpError:
+                return super().dispatch(request, *args, **kwargs)
+
+            operation = plan_incremental(
+                self.schema.graphql_schema,
+                query,
+                variables,
+                operation_name,
+                self.validation_rules,
+            )
+            if operation is not None:
+                self.recorder = start_recording()
+                parts = self.multipart(
+                    request, operation, query, variables, operation_name
+                )
+                if isinstance(request, ASGIRequest):
+                    parts = iterate_in_thread(parts)
+                return StreamingHttpResponse(
+                    parts, content_type='multipart/mixed; boundary="-"'
+                )
+
+        return super().dispatch(request, *args, **kwargs)
+
+    def multipart(self, request, operation, query, variables, operation_name):
+        # One chunk per payload, each is sent as soon as it has been computed
+        yield "\r\n---"
+        payloads = operation.execute(
+            middleware=self.get_middleware(request) or [],
+            context_value=self.get_context(request),
+            root_value=self.get_root_value(request),
+        )
+        while True:
+            # Only computing a payload is timed, not sending it
+            with self.recorder or nullcontext():
+                payload = next(payloads, None)
+            if payload is None:
+                break
+            yield (
+                "\r\nContent-Type: application/json; charset=utf-8\r\n\r\n"
+                + self.encoder(payload)
+                + "\r\n---"
+            )
+        if self.recorder is not None:
+            result = ExecutionResult(errors=operation.errors or None)
+            self.recorder.finish(query, variables, operation_name, result)
+        yield "--\r\n"
+
+    def get_middleware(self, request):
+        middleware = super().get_middleware(request)
+        if self.recorder is None or self.recorder.middleware is None:
+            return middleware
+        return [*(middleware or []), self.recorder.middleware]
+
+    def json_encode(self, request, d, pretty=False):
+        # Pretty-printing is only honoured while DEBUG is on, production
+        # responses are always compact
+        if not settings.DEBUG:
+            return self.encoder(d)
+
+        pretty = self.pretty or pretty or bool(request.GET.get("pretty"))
+        return self.encoder(d, pretty=pretty)
@@ -2,6 +2,8 @@
 ASGI config for bookstore project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP requests go to Django, WebSocket connections to /graphql/ are served by
+the GraphQL subscriptions app.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -13,4 +15,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "bookstore.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from books.subscriptions import GraphQLWebSocketApp  # noqa: E402
+
+websocket_application = GraphQLWebSocketApp(path="/graphql/")
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "websocket":
+        return await websocket_application(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -119,6 +119,91 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+# GraphQL
+# The schema is imported lazily on the first /graphql/ request
+
+GRAPHENE = {
+    "SCHEMA": "books.schema.schema",
+}
+
+# Build the schema (and its introspection result) while the app loads, e.g.
+# in a preforking server's master process, instead of on the first request
+GRAPHQL_PREBUILD_SCHEMA = False
+
+GRAPHQL_GRAPHIQL = DEBUG
+
+GRAPHQL_INTROSPECTION = DEBUG
+
+# Seconds a cached introspection result is kept for, per query text
+GRAPHQL_INTROSPECTION_CACHE_TIMEOUT = 60 * 60
+
+# Background jobs
+# A running job that hasn't reported progress for JOB_LEASE_TIMEOUT seconds
+# lost its worker and is queued again, up to JOB_MAX_ATTEMPTS runs in total
+
+JOB_LEASE_TIMEOUT = 300
+
+JOB_MAX_ATTEMPTS = 3
+
+# host:port of a `manage.py run_event_broker` process, set it to share
+# subscription events between worker processes
+EVENT_BROKER_ADDRESS = None
+
+# Seconds between full rebuilds of the in-memory autocomplete index, so each
+# process also sees rows written by other processes (None never rebuilds)
+AUTOCOMPLETE_REBUILD_INTERVAL = 300
+
+# Number of Author/Publisher rows kept in each process' entity cache (0 turns
+# the process layer off, the per-request identity map is always used)
+ENTITY_CACHE_SIZE = 10000
+
+# Seconds a row stays in the process cache. Saves and deletes invalidate rows
+# through version numbers in the default cache, which only reach other
+# processes (web workers, run_workers) when CACHES uses a shared backend such
+# as Redis or Memcached. With the default per-process LocMemCache, a row
+# changed by another process can be served stale for up to this long.
+ENTITY_CACHE_TTL = 60
+
+# Slow-operation log
+# /graphql/ operations slower than the threshold are logged with their SQL
+# and query plans (None turns the log off)
+
+SLOW_OPERATION_THRESHOLD_MS = 500
+
+# Also time every resolver. This runs a middleware on each field of every
+# request, so only turn it on while investigating.
+SLOW_OPERATION_RESOLVER_TIMING = False
+
+SLOW_OPERATION_LOG = BASE_DIR / "slow_operations.jsonl"
+
+# Variables whose names contain any of these are redacted in the log
+SLOW_OPERATION_REDACT = ["password", "token", "secret", "email"]
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "message": {"format": "%(message)s"},
+    },
+    "handlers": {
+        "slow_operations": {
+            "class": "logging.handlers.RotatingFileHandler",
+            "filename": SLOW_OPERATION_LOG,
+            "maxBytes": 10 * 1024 * 1024,
+            "backupCount": 5,
+            "delay": True,
+            "formatter": "message",
+        },
+    },
+    "loggers": {
+        "books.slow_operations": {
+            "handlers": ["slow_operations"],
+            "level": "WARNING",
+            "propagate": False,
+        },
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
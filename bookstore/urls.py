@@ -14,13 +14,16 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
 from django.views.decorators.csrf import csrf_exempt
-from graphene_django.views import GraphQLView
-from books.schema import schema
+from books.views import BookstoreGraphQLView
 
 urlpatterns = [
     path("admin/", admin.site.urls),
-    path("graphql/", csrf_exempt(GraphQLView.as_view(schema=schema, graphiql=True))),
+    path(
+        "graphql/",
+        csrf_exempt(BookstoreGraphQLView.as_view(graphiql=settings.GRAPHQL_GRAPHIQL)),
+    ),
 ]